@@ -0,0 +1,404 @@
+from lib import Heuristics, Puzzle, PatternDatabase, SearchMetrics, State
+import argparse, csv, json, math, os, platform, random, subprocess, time
+import multiprocessing
+from queue import Empty
+
+# Instance sets are regenerated from these seeds on every run, so every machine benchmarks the same boards
+SEED = 20230401
+KORF15_FILE = "./100linear15.csv"
+KORF15_HARD = 10 # instances of the 15-korf-hard set, the ones that took the most nodes when 100linear15.csv was made
+KORF15_EASY = 10 # instances of the 15-korf-easy set, the ones with the shortest optimal solutions
+BUCKETS8 = [("8-easy", 0, 15), ("8-medium", 16, 22), ("8-hard", 23, 31)] # by optimal solution length
+PER_BUCKET8 = 10
+WALKS24 = [("24-walk20", 20), ("24-walk30", 30), ("24-walk40", 40)] # by length of the random walk from the goal
+PER_BUCKET24 = 5
+POLL = 1 # seconds to wait for a configuration's result before checking its process is still alive
+
+def korf15():
+  """
+  ----------------------------------------------------------
+  Description: The 100 15-puzzles in 100linear15.csv.
+  Use: sets = {"15-korf": korf15()}
+  ----------------------------------------------------------
+  """
+  with open(KORF15_FILE) as file:
+    return [list(map(int, row["Puzzle"].split("-"))) for row in csv.DictReader(file)]
+
+def korf15Hard():
+  """
+  ----------------------------------------------------------
+  Description: The KORF15_HARD puzzles in 100linear15.csv that took the most
+    nodes to solve, hardest first.
+  Use: sets = {"15-korf-hard": korf15Hard()}
+  ----------------------------------------------------------
+  """
+  with open(KORF15_FILE) as file:
+    rows = sorted(csv.DictReader(file), key=lambda row: -int(row["Nodes Explored"]))
+  return [list(map(int, row["Puzzle"].split("-"))) for row in rows[:KORF15_HARD]]
+
+def korf15Easy():
+  """
+  ----------------------------------------------------------
+  Description: The KORF15_EASY puzzles in 100linear15.csv with the shortest
+    optimal solutions, fewest nodes first among equals. Small enough for
+    every search and heuristic, unlike the whole set, where A* with
+    manhattan needs gigabytes.
+  Use: sets = {"15-korf-easy": korf15Easy()}
+  ----------------------------------------------------------
+  """
+  with open(KORF15_FILE) as file:
+    rows = sorted(csv.DictReader(file), key=lambda row: (int(row["Steps to Solution"]), int(row["Nodes Explored"])))
+  return [list(map(int, row["Puzzle"].split("-"))) for row in rows[:KORF15_EASY]]
+
+def random8():
+  """
+  ----------------------------------------------------------
+  Description: Seeded random 8-puzzles, split into BUCKETS8 by the length of
+    their optimal solution.
+  Use: sets = random8()
+  ----------------------------------------------------------
+  Returns:
+    sets - Dictionary of bucket name to list of boards.
+  ----------------------------------------------------------
+  """
+  rng = random.Random(SEED)
+  sets = {name: [] for name, low, high in BUCKETS8}
+  while any(len(boards) < PER_BUCKET8 for boards in sets.values()):
+    board = list(range(9))
+    rng.shuffle(board)
+    s = State(board, 3)
+    if not s.isSolvable():
+      continue
+    length = len(Puzzle.solvePuzzleIDA(s)["pathToSolution"])
+    for name, low, high in BUCKETS8:
+      if low <= length <= high and len(sets[name]) < PER_BUCKET8:
+        sets[name].append(board)
+  return sets
+
+def random24():
+  """
+  ----------------------------------------------------------
+  Description: Seeded 24-puzzles made by random walks of the lengths in
+    WALKS24 from the goal, never undoing the previous move.
+  Use: sets = random24()
+  ----------------------------------------------------------
+  Returns:
+    sets - Dictionary of bucket name to list of boards.
+  ----------------------------------------------------------
+  """
+  rng = random.Random(SEED)
+  neighbours = State.neighbourTable(5)
+  sets = {}
+  for name, length in WALKS24:
+    sets[name] = []
+    for i in range(PER_BUCKET24):
+      board = list(range(25))
+      blank = 0
+      previous = -1
+      for step in range(length):
+        index = rng.choice([n for n in neighbours[blank] if n != previous])
+        board[blank], board[index] = board[index], 0
+        previous, blank = blank, index
+      sets[name].append(board)
+  return sets
+
+def buildSets(names, limit):
+  sets = {}
+  if any(name.startswith("8-") for name in names):
+    sets.update(random8())
+  if "15-korf" in names:
+    sets["15-korf"] = korf15()
+  if "15-korf-easy" in names:
+    sets["15-korf-easy"] = korf15Easy()
+  if "15-korf-hard" in names:
+    sets["15-korf-hard"] = korf15Hard()
+  if any(name.startswith("24-") for name in names):
+    sets.update(random24())
+  return {name: sets[name][:limit] for name in names}
+
+def runIsolated(target, args):
+  """
+  ----------------------------------------------------------
+  Description: Calls target in a fresh process, which unlike a pool worker
+    may start processes of its own. Raises RuntimeError if the process dies
+    without a result, e.g. when it is killed for running out of memory.
+  Use: result = runIsolated(runConfig, (boards, "MANHATTAN", "astar", {}))
+  ----------------------------------------------------------
+  """
+  results = multiprocessing.Queue()
+  process = multiprocessing.Process(target=runInto, args=(results, target, args))
+  process.start()
+  while True:
+    try:
+      ok, result = results.get(timeout=POLL)
+      break
+    except Empty: # nothing yet, make sure the process is still there to reply
+      if process.exitcode != None:
+        try:
+          ok, result = results.get(timeout=POLL) # it may have put its result just before exiting
+          break
+        except Empty:
+          raise RuntimeError("exited with code {} without a result".format(process.exitcode))
+  process.join()
+  if not ok:
+    raise result
+  return result
+
+def runInto(results, target, args):
+  try:
+    results.put((True, target(*args)))
+  except Exception as error:
+    results.put((False, error))
+
+def runConfig(boards, heuristicName, algorithm, options):
+  """
+  ----------------------------------------------------------
+  Description: Solves every board with one configuration. Runs in its own
+    process so the peak RSS belongs to this configuration alone.
+  Use: result = runIsolated(runConfig, (boards, "MANHATTAN", "astar", {}))
+  ----------------------------------------------------------
+  Returns:
+    result - Dictionary of the per instance node counts and path lengths,
+      and the totals for the set.
+  ----------------------------------------------------------
+  """
+  heuristic = Heuristics.strToHeuristic(heuristicName)
+  solver = Puzzle.strToSolver(algorithm)
+  nodes = []
+  pathLengths = []
+  solveTime = 0
+  start = time.time()
+  for board in boards:
+    stats = solver(State(board, int(math.sqrt(len(board))), heuristic=heuristic), **options)
+    nodes.append(stats["numNodesExplored"])
+    pathLengths.append(len(stats["pathToSolution"]))
+    solveTime += stats["timeTaken"]
+  return {
+    "nodes": nodes,
+    "pathLengths": pathLengths,
+    "totalNodes": sum(nodes),
+    "wallTime": time.time() - start,
+    "nodesPerSecond": sum(nodes) / (solveTime if solveTime != 0 else 0.01),
+    "peakRSS": SearchMetrics.peakRSS()
+  }
+
+def metadata():
+  try:
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip() != ""
+  except (OSError, subprocess.CalledProcessError):
+    commit, dirty = None, None
+  return {
+    "commit": commit,
+    "dirty": dirty,
+    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "machine": platform.node(),
+    "platform": platform.platform(),
+    "processor": platform.processor(),
+    "cpuCount": os.cpu_count(),
+    "python": platform.python_version()
+  }
+
+def resultKey(result):
+  return "{}|{}|{}|{}".format(result["set"], result["algorithm"], result["heuristic"], json.dumps(result["options"], sort_keys=True))
+
+def deterministic(result):
+  return result["algorithm"] != "hda" or result["options"]["workers"] == 1 # with more workers the order states arrive in depends on timing
+
+def compare(results, baseline, threshold):
+  """
+  ----------------------------------------------------------
+  Description: Compares results against a baseline run. Node counts and path
+    lengths are deterministic, so any change in them is an algorithmic
+    change. Time is only flagged when nodes/s drops by more than threshold.
+    hda with several workers expands a different number of nodes every run,
+    so it is only compared on path lengths and wall time. A configuration
+    that failed counts as a regression.
+  Use: regressions = compare(results, baseline, 0.1)
+  ----------------------------------------------------------
+  Returns:
+    regressions - The number of results that got worse.
+  ----------------------------------------------------------
+  """
+  previous = {resultKey(result): result for result in baseline["results"]}
+  if baseline["meta"]["machine"] != results["meta"]["machine"]:
+    print("\033[93mBaseline was recorded on {}, time comparisons are not meaningful across machines.\033[0m".format(baseline["meta"]["machine"]))
+  regressions = 0
+  print("{:<12} {:<8} {:<16} {:<14} {:>12} {:>12} {:>9}  {}".format("Set", "Search", "Heuristic", "Options", "Nodes", "Baseline", "nodes/s", "Status"))
+  for result in results["results"]:
+    old = previous.get(resultKey(result))
+    if "error" in result:
+      regressions += 1
+      options = ",".join(str(value) for value in result["options"].values())
+      print("{:<12} {:<8} {:<16} {:<14} {:>12} {:>12} {:>9}  {}".format(result["set"], result["algorithm"], result["heuristic"], options, "-", old["totalNodes"] if old != None and "error" not in old else "-", "-", "FAILED: " + result["error"]))
+      continue
+    if old == None or "error" in old:
+      status = "new"
+      oldNodes = "-"
+      speed = "-"
+    else:
+      oldNodes = old["totalNodes"]
+      speed = "{:+.1%}".format(result["nodesPerSecond"] / old["nodesPerSecond"] - 1)
+      if result["pathLengths"] != old["pathLengths"]:
+        status = "REGRESSION: path lengths changed"
+      elif not deterministic(result): # nodes vary run to run, so only the wall time says anything
+        speed = "{:+.1%}".format(old["wallTime"] / max(result["wallTime"], 0.001) - 1)
+        status = "REGRESSION: slower" if result["wallTime"] > old["wallTime"] / (1 - threshold) else "ok"
+      elif result["totalNodes"] > old["totalNodes"]:
+        status = "REGRESSION: more nodes expanded"
+      elif result["nodes"] != old["nodes"]:
+        status = "improved: fewer nodes expanded"
+      elif result["nodesPerSecond"] < old["nodesPerSecond"] * (1 - threshold):
+        status = "REGRESSION: slower"
+      else:
+        status = "ok"
+      if status.startswith("REGRESSION"):
+        regressions += 1
+    options = ",".join(str(value) for value in result["options"].values())
+    print("{:<12} {:<8} {:<16} {:<14} {:>12} {:>12} {:>9}  {}".format(result["set"], result["algorithm"], result["heuristic"], options, result["totalNodes"], oldNodes, speed, status))
+  return regressions
+
+def compareSearches(results):
+  """
+  ----------------------------------------------------------
+  Description: Prints how the other searches did against A* (with the first
+    queue and tie-break options run) on the same set and heuristic.
+  Use: compareSearches(results)
+  ----------------------------------------------------------
+  """
+  astar = {}
+  for result in results["results"]:
+    if result["algorithm"] == "astar" and "error" not in result:
+      astar.setdefault((result["set"], result["heuristic"]), result)
+  rows = [result for result in results["results"] if result["algorithm"] != "astar" and "error" not in result and (result["set"], result["heuristic"]) in astar]
+  if len(rows) == 0:
+    return
+  print("{:<12} {:<8} {:<16} {:>12} {:>12} {:>10} {:>10}  {}".format("Set", "Search", "Heuristic", "Nodes", "A* nodes", "Nodes", "Time", "Paths"))
+  for result in rows:
+    reference = astar[(result["set"], result["heuristic"])]
+    paths = "same" if result["pathLengths"] == reference["pathLengths"] else "DIFFERENT"
+    print("{:<12} {:<8} {:<16} {:>12} {:>12} {:>10} {:>10}  {}".format(result["set"], result["algorithm"], result["heuristic"], result["totalNodes"], reference["totalNodes"],
+      "{:+.1%}".format(result["totalNodes"] / max(reference["totalNodes"], 1) - 1), "{:+.1%}".format(result["wallTime"] / max(reference["wallTime"], 0.001) - 1), paths))
+
+def printSpeedups(results):
+  """
+  ----------------------------------------------------------
+  Description: Prints the wall time speedup of every hda run over hda with
+    1 worker on the same set and heuristic.
+  Use: printSpeedups(results)
+  ----------------------------------------------------------
+  """
+  finished = [result for result in results["results"] if "error" not in result]
+  single = {(result["set"], result["heuristic"]): result for result in finished if result["algorithm"] == "hda" and result["options"]["workers"] == 1}
+  rows = [result for result in finished if result["algorithm"] == "hda" and (result["set"], result["heuristic"]) in single]
+  if len(rows) == 0:
+    return
+  print("{:<12} {:<16} {:>8} {:>12} {:>10} {:>8}  {}".format("Set", "Heuristic", "Workers", "Nodes", "Wall time", "Speedup", "Paths"))
+  for result in rows:
+    reference = single[(result["set"], result["heuristic"])]
+    paths = "same" if result["pathLengths"] == reference["pathLengths"] else "DIFFERENT"
+    print("{:<12} {:<16} {:>8} {:>12} {:>10.2f} {:>8.2f}  {}".format(result["set"], result["heuristic"], result["options"]["workers"], result["totalNodes"], result["wallTime"], reference["wallTime"] / max(result["wallTime"], 0.001), paths))
+
+def checkAdmissibility(heuristicNames):
+  """
+  ----------------------------------------------------------
+  Description: Checks the heuristics never overestimate, against the optimal
+    solution length of every solvable 8-puzzle found by breadth first search
+    back from the goal.
+  Use: violations = checkAdmissibility(["MANHATTAN"])
+  ----------------------------------------------------------
+  Returns:
+    violations - The number of (heuristic, board) pairs where h was larger
+      than the optimal solution length.
+  ----------------------------------------------------------
+  """
+  bits = State.bitsPerTile(9)
+  distances = Puzzle.optimalLengths(3)
+  print("Checking against the optimal lengths of all {} solvable 8-puzzles".format(len(distances)))
+  
+  violations = 0
+  for name in heuristicNames:
+    heuristic = Heuristics.strToHeuristic(name)
+    overestimates = 0
+    totalH = 0
+    for key, distance in distances.items():
+      h = State(State.keyToBoard(key, 9, bits), 3, heuristic=heuristic).h
+      totalH += h
+      if h > distance + 1e-9:
+        overestimates += 1
+    violations += overestimates
+    print("\t{:<16} ---> {} overestimates, average h {:.2f} of average optimal {:.2f}".format(name, overestimates, totalH / len(distances), sum(distances.values()) / len(distances)))
+  return violations
+
+def engineOptions(algorithm, args):
+  if algorithm == "astar":
+    return [{"queue": queue, "tiebreak": tiebreak} for queue in args.queues for tiebreak in args.tiebreaks]
+  if algorithm == "hda":
+    return [{"workers": workers} for workers in args.speedup]
+  if algorithm == "external":
+    return [{"memoryLimit": memoryLimit} for memoryLimit in args.memoryLimit]
+  return [{}]
+
+def main():
+  sets = [name for name, low, high in BUCKETS8] + ["15-korf-easy"] + [name for name, length in WALKS24]
+  parser = argparse.ArgumentParser(description='Benchmarks the n-puzzle solvers on fixed instance sets')
+  parser.add_argument("--sets", help="The instance sets to run, 15-korf (all 100) and 15-korf-hard are only run when asked for", nargs="+", choices=sets + ["15-korf", "15-korf-hard"], default=sets)
+  parser.add_argument("-H", "--heuristics", help="The heuristics to run", nargs="+", choices=["manhattan", "displacement", "rowcol", "euclidean", "linear", "patterndb"], default=["manhattan", "linear", "patterndb"])
+  parser.add_argument("-a", "--algorithms", help="The searches to run", nargs="+", choices=["astar", "ida", "bidir", "hda", "external"], default=["astar", "ida", "bidir"])
+  parser.add_argument("--speedup", help="The numbers of hda workers to run", nargs="+", type=int, default=[1, 2, 4])
+  parser.add_argument("--memoryLimit", help="The RAM caps in MiB to run external with", nargs="+", type=int, default=[256])
+  parser.add_argument("-q", "--queues", help="The A* open lists to run", nargs="+", choices=["auto", "bucket", "heap"], default=["auto"])
+  parser.add_argument("-t", "--tiebreaks", help="The A* tie-breaks to run", nargs="+", choices=["h", "g", "none"], default=["h"])
+  parser.add_argument("-l", "--limit", help="Only run the first LIMIT instances of each set", type=int, default=None)
+  parser.add_argument("-o", "--output", help="The JSON file to write results to", default="./benchmarks/results.json")
+  parser.add_argument("-b", "--baseline", help="The results file to compare against", default="./benchmarks/baseline.json")
+  parser.add_argument("-T", "--threshold", help="The drop in nodes/s flagged as a regression, as a fraction", type=float, default=0.1)
+  parser.add_argument("--admissibility", help="Only check the heuristics never overestimate on any 8-puzzle, then exit", action="store_true")
+  parser.add_argument("--update-baseline", help="Also write the results to the baseline file", action="store_true")
+  args = parser.parse_args()
+
+  names = {"manhattan": "MANHATTAN", "displacement": "DISPLACEMENT", "rowcol": "ROWCOL", "euclidean": "EUCLIDEAN", "linear": "LINEARCONFLICT", "patterndb": "PATTERNDB"}
+  if args.admissibility:
+    heuristics = [heuristic for heuristic in args.heuristics if heuristic != "patterndb" or os.path.exists(PatternDatabase.defaultPath(8, next(iter(PatternDatabase.PARTITIONS[8]))))]
+    exit(1 if checkAdmissibility([names[heuristic] for heuristic in heuristics]) > 0 else 0)
+  instances = buildSets(args.sets, args.limit)
+  results = {"meta": metadata(), "results": []}
+  for setName, boards in instances.items():
+    size = len(boards[0]) - 1
+    for algorithm in args.algorithms:
+      for heuristic in args.heuristics:
+        if heuristic == "patterndb":
+          partitions = PatternDatabase.PARTITIONS.get(size, {})
+          if len(partitions) == 0 or not os.path.exists(PatternDatabase.defaultPath(size, next(iter(partitions)))):
+            print("Skipping {} {} patterndb, no pattern database built for the {}-puzzle".format(setName, algorithm, size))
+            continue
+        if algorithm == "external" and not (Heuristics.isIntegral(Heuristics.strToHeuristic(names[heuristic])) and Heuristics.isConsistent(Heuristics.strToHeuristic(names[heuristic]))):
+          print("Skipping {} external {}, it needs an integer valued consistent heuristic".format(setName, heuristic))
+          continue
+        for options in engineOptions(algorithm, args):
+          print("Running {} {} {} {} ({} puzzles)".format(setName, algorithm, names[heuristic], options, len(boards)), flush=True)
+          try:
+            result = runIsolated(runConfig, (boards, names[heuristic], algorithm, options)) # a fresh process per configuration keeps peak RSS separate
+          except RuntimeError as error:
+            print("\033[91mFailed {} {} {} {}: {}\033[0m".format(setName, algorithm, names[heuristic], options, error))
+            result = {"error": str(error)}
+          result.update({"set": setName, "algorithm": algorithm, "heuristic": names[heuristic], "options": options, "instances": len(boards)})
+          results["results"].append(result)
+
+  for path in [args.output] + ([args.baseline] if args.update_baseline else []):
+    if os.path.dirname(path) != "":
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+      json.dump(results, file, indent=2)
+  print("Wrote " + args.output)
+  compareSearches(results)
+  printSpeedups(results)
+
+  if not args.update_baseline and os.path.exists(args.baseline):
+    with open(args.baseline) as file:
+      baseline = json.load(file)
+    if compare(results, baseline, args.threshold) > 0:
+      exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,41 @@
+from lib import Heuristics, Puzzle, PatternDatabase, State
+import argparse, time
+
+parser = argparse.ArgumentParser(description='Builds the pattern databases used by the patterndb heuristic')
+parser.add_argument("-s", "--size", help="The size of the puzzle e.g. 15 for 15-puzzle (4x4)", choices=sorted(PatternDatabase.PARTITIONS), type=int, default=15)
+parser.add_argument("-P", "--partition", help="How the tiles are split into patterns e.g. 5-5-5, defaults to the first partition listed for the size", default=None)
+parser.add_argument("-o", "--outputFile", help="Where to write the database, defaults to " + PatternDatabase.DIRECTORY + "<size>-<partition>.pdb", default=None)
+parser.add_argument("-v", "--verify", help="Solve this many random puzzles with both manhattan and the new database and compare them", type=int, default=0)
+parser.add_argument("-S", "--seed", help="The seed for the puzzles used by --verify", type=int, default=None)
+args = parser.parse_args()
+
+partitions = PatternDatabase.PARTITIONS[args.size]
+partition = args.partition if args.partition != None else next(iter(partitions))
+if partition not in partitions:
+  parser.error("partition must be one of " + ", ".join(partitions) + " for the {}-puzzle".format(args.size))
+outputFile = args.outputFile if args.outputFile != None else PatternDatabase.defaultPath(args.size, partition)
+
+print("Building {} pattern database for the {}-puzzle".format(partition, args.size))
+start = time.time()
+db = PatternDatabase.build(int((args.size + 1) ** 0.5), partitions[partition], debug=True)
+db.save(outputFile)
+print("Wrote {} in {:.2f}s".format(outputFile, time.time() - start))
+
+if args.verify > 0:
+  PatternDatabase.use(outputFile)
+  puzzles = Puzzle.randomizePuzzles(Heuristics.MANHATTAN, args.size, args.verify, args.seed)
+  mismatches = 0
+  totalNodes = {"MANHATTAN": 0, "PATTERNDB": 0}
+  for puzzle in puzzles:
+    manhattan = Puzzle.solvePuzzle(puzzle)
+    patternDB = Puzzle.solvePuzzle(State(puzzle.board, puzzle.width, heuristic=Heuristics.PATTERNDB))
+    totalNodes["MANHATTAN"] += manhattan["numNodesExplored"]
+    totalNodes["PATTERNDB"] += patternDB["numNodesExplored"]
+    if len(manhattan["pathToSolution"]) != len(patternDB["pathToSolution"]):
+      mismatches += 1
+      print("MISMATCH:\t {} manhattan {} moves, patterndb {} moves".format(puzzle.board, len(manhattan["pathToSolution"]), len(patternDB["pathToSolution"])))
+  print("\t{:<38} ---> {}/{}".format("Path lengths matching manhattan:", len(puzzles) - mismatches, len(puzzles)))
+  print("\t{:<38} ---> {}".format("Average expanded nodes (manhattan):", totalNodes["MANHATTAN"] / len(puzzles)))
+  print("\t{:<38} ---> {}".format("Average expanded nodes (patterndb):", totalNodes["PATTERNDB"] / len(puzzles)))
+  if mismatches > 0:
+    exit(1)
@@ -0,0 +1,140 @@
+from lib import Heuristics, InvalidPuzzle, Puzzle
+import argparse, http.client, json, socket, threading, time
+from urllib.parse import urlsplit
+
+class UnixConnection(http.client.HTTPConnection):
+  """
+  ----------------------------------------------------------
+  Description: HTTP connection over a Unix socket, for a server started with
+    --socket.
+  Use: connection = UnixConnection("/tmp/npuzzle.sock")
+  ----------------------------------------------------------
+  """
+  def __init__(self, path, timeout=None):
+    super().__init__("localhost", timeout=timeout)
+    self.path = path
+
+  def connect(self):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(self.timeout)
+    self.sock.connect(self.path)
+
+def connect(args):
+  if args.socket != None:
+    return UnixConnection(args.socket)
+  url = urlsplit(args.url)
+  return http.client.HTTPConnection(url.hostname, url.port or 80)
+
+def solve(connection, entries):
+  """
+  ----------------------------------------------------------
+  Description: Sends entries to the server's /solve and yields the results
+    as they are streamed back, which can be out of order.
+  Use: for result in solve(connection, [{"puzzle": "1,2,0,3,4,5,6,7,8"}]):
+  ----------------------------------------------------------
+  Parameters:
+    connection - An open HTTPConnection to the server, kept alive.
+    entries - Boards or objects with a "puzzle" key and options, see
+      SolveServer.solveEntry in server.py.
+  Yields:
+    result - The result of each entry, with its index in entries.
+  ----------------------------------------------------------
+  """
+  body = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+  connection.request("POST", "/solve", body, {"Content-Type": "application/x-ndjson"})
+  response = connection.getresponse()
+  if response.status != 200:
+    raise RuntimeError("{} {}: {}".format(response.status, response.reason, response.read().decode().strip()))
+  for line in response: # http.client undoes the chunking
+    yield json.loads(line)
+
+def stats(connection):
+  connection.request("GET", "/stats")
+  return json.loads(connection.getresponse().read())
+
+def printResult(result):
+  if "error" in result:
+    print("{}\t{}\terror: {}".format(result["index"], result.get("puzzle", ""), result["error"]))
+  else:
+    print("{}\t{}\t{} {} steps, {} nodes, {:.3f}s latency{}".format(result["index"], result["puzzle"], result["status"], result["steps"], result["nodes"], result["latency"], " (cached)" if result["cached"] else ""))
+
+def loadTest(args, entries):
+  """
+  ----------------------------------------------------------
+  Description: Sends every entry as its own request from args.concurrency
+    threads, each with a kept alive connection, like callers submitting
+    single boards, and prints the throughput and client side latencies.
+  Use: loadTest(args, entries)
+  ----------------------------------------------------------
+  """
+  latencies = []
+  errors = []
+  lock = threading.Lock()
+  def run(start):
+    connection = connect(args)
+    for entry in entries[start::args.concurrency]:
+      sent = time.time()
+      result = list(solve(connection, [entry]))[0] # read to the end so the connection can be reused
+      with lock:
+        latencies.append(time.time() - sent)
+        if "error" in result:
+          errors.append(result)
+    connection.close()
+  start = time.time()
+  threads = [threading.Thread(target=run, args=(i,)) for i in range(args.concurrency)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.time() - start
+  latencies.sort()
+  print("\t{:<30} ---> {} in {:.2f}s, {:.1f} boards/s".format("Boards solved:", len(latencies), elapsed, len(latencies) / elapsed))
+  print("\t{:<30} ---> {}".format("Errors:", len(errors)))
+  for p in (50, 90, 99):
+    print("\t{:<30} ---> {:.4f}s".format("Client latency p{}:".format(p), latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]))
+
+def main():
+  parser = argparse.ArgumentParser(description='Sends boards to a running server.py and prints the results')
+  parser.add_argument("--url", help="The server's address", default="http://127.0.0.1:8765")
+  parser.add_argument("--socket", help="The server's Unix socket, instead of --url", default=None)
+  parser.add_argument("-p", "--puzzle", help="A board to solve e.g. '-p 1,2,5,3,4,0,6,7,8'", default=None)
+  parser.add_argument("-i", "--input", help="Solve the boards in a CSV or JSONL file", default=None)
+  parser.add_argument("-n", "--numberOfPuzzles", help="Solve this many random boards", type=int, default=0)
+  parser.add_argument("-s", "--size", help="The size of the random boards", choices=[8, 15, 24, 35], type=int, default=8)
+  parser.add_argument("-S", "--seed", help="The seed for the random boards", type=int, default=None)
+  parser.add_argument("-H", "--heuristic", help="The heuristic to solve with", choices=["manhattan", "displacement", "rowcol", "euclidean", "linear", "patterndb"], default="manhattan")
+  parser.add_argument("--weight", help="Expand by g + WEIGHT * h, see main.py", type=float, default=None)
+  parser.add_argument("--timeLimit", "--time-limit", help="The most seconds to spend on each board, at most the server's limit", type=float, default=None)
+  parser.add_argument("-c", "--concurrency", help="Send each board as its own request from this many threads and print the throughput, instead of one streamed batch", type=int, default=0)
+  parser.add_argument("--stats", help="Print the server's queue depth and latency percentiles", action="store_true")
+  args = parser.parse_args()
+
+  boards = []
+  if args.puzzle != None:
+    boards.append(args.puzzle)
+  if args.input != None:
+    boards += [puzzle.board for puzzle in Puzzle.readPuzzles(args.input, Heuristics.MANHATTAN) if not isinstance(puzzle, InvalidPuzzle)]
+  if args.numberOfPuzzles > 0:
+    boards += [puzzle.board for puzzle in Puzzle.randomizePuzzles(Heuristics.MANHATTAN, args.size, args.numberOfPuzzles, args.seed)]
+  options = {"heuristic": args.heuristic}
+  if args.weight != None:
+    options["weight"] = args.weight
+  if args.timeLimit != None:
+    options["timeLimit"] = args.timeLimit
+  entries = [dict(options, puzzle=board) for board in boards]
+
+  if len(entries) != 0:
+    if args.concurrency > 0:
+      loadTest(args, entries)
+    else:
+      connection = connect(args)
+      for result in solve(connection, entries):
+        printResult(result)
+      connection.close()
+  if args.stats or len(entries) == 0:
+    connection = connect(args)
+    print(json.dumps(stats(connection), indent=2))
+    connection.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,170 @@
+from lib import Heuristics, Puzzle, State
+import argparse, json, math, os, random, sys, time
+
+HEURISTICS = {"manhattan": Heuristics.MANHATTAN, "displacement": Heuristics.DISPLACEMENT, "rowcol": Heuristics.ROWCOL, "euclidean": Heuristics.EUCLIDEAN, "linear": Heuristics.LINEARCONFLICT, "patterndb": Heuristics.PATTERNDB}
+CHUNK = 10000 # lines written at a time
+
+def uniformBoards(rng, width):
+  """
+  ----------------------------------------------------------
+  Description: Endless uniformly random solvable boards. Each board is a
+    shuffle with its parity fixed rather than rejected: swapping the first
+    two tiles (not the blank) flips the inversion parity without moving the
+    blank, which pairs every unsolvable shuffle with exactly one solvable
+    one, so the result stays uniform.
+  Use: for board in uniformBoards(random.Random(1), 4):
+  ----------------------------------------------------------
+  Yields:
+    board, None - A board, with no walk length.
+  ----------------------------------------------------------
+  """
+  board = list(range(width * width))
+  while True:
+    rng.shuffle(board)
+    parity = State.inversionParity(board)
+    if width % 2 == 0: # the blank's row counts too, see State.isSolvable
+      parity ^= (board.index(0) // width) % 2
+    if parity == 1:
+      first = 0 if board[0] != 0 else 1
+      second = first + 1 if board[first + 1] != 0 else first + 2
+      board[first], board[second] = board[second], board[first]
+    yield list(board), None
+
+def walkBoards(rng, width, low, high):
+  """
+  ----------------------------------------------------------
+  Description: Endless boards made by random walks from the goal, never
+    undoing the previous move. The walk length is an upper bound on the
+    optimal solution length and tracks it closely for short walks.
+  Use: for board, length in walkBoards(random.Random(1), 5, 40, 40):
+  ----------------------------------------------------------
+  Parameters:
+    low, high - The walk length of each board is picked uniformly from
+      low to high.
+  Yields:
+    board, length - A board and the length of the walk that made it.
+  ----------------------------------------------------------
+  """
+  neighbours = State.neighbourTable(width)
+  while True:
+    board = list(range(width * width))
+    blank = 0
+    previous = -1
+    length = rng.randint(low, high)
+    for step in range(length):
+      moves = neighbours[blank]
+      index = moves[rng.randrange(len(moves))]
+      while index == previous:
+        index = moves[rng.randrange(len(moves))]
+      board[blank], board[index] = board[index], 0
+      previous, blank = blank, index
+    yield board, length
+
+def measure(stratify, heuristic, width):
+  """
+  ----------------------------------------------------------
+  Description: Makes the function boards are stratified by.
+  Use: value = measure("heuristic", Heuristics.MANHATTAN, 4)(board)
+  ----------------------------------------------------------
+  Parameters:
+    stratify - "heuristic" for the heuristic's value, or "optimal" for the
+      optimal solution length, looked up in a table of every board for the
+      8-puzzle and smaller and solved with A* and the heuristic otherwise.
+  Returns:
+    value - Function of a board to its value.
+  ----------------------------------------------------------
+  """
+  n = width * width
+  if stratify == "optimal":
+    if width <= 3:
+      lengths = Puzzle.optimalLengths(width)
+      return lambda board: lengths[State(board, width, h=0).toKey()]
+    return lambda board: len(Puzzle.solvePuzzle(State(board, width, heuristic=heuristic))["pathToSolution"])
+  costs = Heuristics.tileTable(heuristic, width)
+  if costs != None: # a sum of per-tile costs, no State needed
+    return lambda board: sum(costs[tile * n + index] for index, tile in enumerate(board))
+  return lambda board: State(board, width, heuristic=heuristic).h
+
+def parseBins(bins):
+  ranges = []
+  for text in bins:
+    low, _, high = text.partition("-")
+    ranges.append((float(low), float(high if high != "" else low)))
+  return ranges
+
+def main():
+  parser = argparse.ArgumentParser(description='Generates solvable n-puzzles in bulk, in a format main.py --input reads')
+  parser.add_argument("-s", "--size", help="The size of the puzzle e.g. 8 for 8-puzzle (3x3)", choices=[8, 15, 24, 35], type=int, default=8)
+  parser.add_argument("-n", "--numberOfPuzzles", help="The number of boards to write, per bin with --stratify", type=int, default=100)
+  parser.add_argument("-S", "--seed", help="The seed for the random number generator", type=int, default=None)
+  parser.add_argument("-o", "--outputFile", help="The file to write, - for stdout", default="-")
+  parser.add_argument("--format", help="The output format, auto goes by the file extension and is csv for stdout", choices=["auto", "csv", "jsonl"], default="auto")
+  parser.add_argument("--walk", help="Make boards by random walks of this many moves from the goal, or a length picked from MIN to MAX, instead of uniformly at random", nargs="+", type=int, default=None)
+  parser.add_argument("--stratify", help="Write -n boards to each of --bins by heuristic value or optimal solution length", choices=["heuristic", "optimal"], default=None)
+  parser.add_argument("--bins", help="The ranges of values to stratify into e.g. 10-19 20-29 30", nargs="+", default=None)
+  parser.add_argument("-H", "--heuristic", help="The heuristic to stratify by, and to solve with for optimal lengths above the 8-puzzle", choices=list(HEURISTICS), default="manhattan")
+  parser.add_argument("--maxCandidates", help="Give up on filling the bins after generating this many boards, defaults to 1000 per board wanted", type=int, default=None)
+  args = parser.parse_args()
+
+  width = math.isqrt(args.size + 1)
+  if args.walk != None and (len(args.walk) > 2 or min(args.walk) < 0 or args.walk[0] > args.walk[-1]):
+    parser.error("--walk takes a length or MIN MAX")
+  if (args.stratify == None) != (args.bins == None):
+    parser.error("--stratify and --bins go together")
+  try:
+    bins = parseBins(args.bins) if args.bins != None else None
+  except ValueError:
+    parser.error("bins are a value or a range e.g. 10-19")
+  fileFormat = args.format
+  if fileFormat == "auto":
+    fileFormat = "jsonl" if os.path.splitext(args.outputFile)[1].lower() in (".jsonl", ".json", ".ndjson") else "csv"
+
+  rng = random.Random(args.seed)
+  boards = walkBoards(rng, width, args.walk[0], args.walk[-1]) if args.walk != None else uniformBoards(rng, width)
+  heuristic = HEURISTICS[args.heuristic]
+  value = measure(args.stratify, heuristic, width) if args.stratify != None else None
+  column = {"heuristic": Heuristics.heuristicToStr(heuristic), "optimal": "Optimal"}.get(args.stratify)
+  wanted = args.numberOfPuzzles * (len(bins) if bins != None else 1)
+  maxCandidates = args.maxCandidates if args.maxCandidates != None else wanted * 1000
+
+  file = sys.stdout if args.outputFile == "-" else open(args.outputFile, "w", newline="")
+  start = time.time()
+  try:
+    if fileFormat == "csv":
+      file.write(",".join(["Puzzle"] + (["Walk"] if args.walk != None else []) + ([column] if column != None else [])) + "\n")
+    counts = [0] * (len(bins) if bins != None else 1)
+    written = 0
+    candidates = 0
+    lines = []
+    for board, length in boards:
+      if written == wanted or candidates == maxCandidates:
+        break
+      candidates += 1
+      fields = {"puzzle": "-".join(map(str, board))}
+      if length != None:
+        fields["walk"] = length
+      if bins != None:
+        fields[column.lower()] = value(board)
+        slot = next((i for i, (low, high) in enumerate(bins) if low <= fields[column.lower()] <= high and counts[i] < args.numberOfPuzzles), None)
+        if slot == None:
+          continue
+        counts[slot] += 1
+      lines.append(json.dumps(fields) + "\n" if fileFormat == "jsonl" else ",".join(str(field) for field in fields.values()) + "\n")
+      written += 1
+      if len(lines) == CHUNK:
+        file.write("".join(lines))
+        lines = []
+    file.write("".join(lines))
+  finally:
+    if file is not sys.stdout:
+      file.close()
+  print("Wrote {} boards to {} in {:.2f}s from {} candidates".format(written, args.outputFile if args.outputFile != "-" else "stdout", time.time() - start, candidates), file=sys.stderr)
+  if written < wanted and bins != None:
+    for (low, high), count in zip(bins, counts):
+      if count < args.numberOfPuzzles:
+        print("Only {} of {} boards in bin {:g}-{:g}".format(count, args.numberOfPuzzles, low, high), file=sys.stderr)
+  if written < wanted:
+    exit(1)
+
+if __name__ == "__main__":
+  main()
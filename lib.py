@@ -1,6 +1,12 @@
-import math, random, heapq, time
-from mem_top import mem_top
+import math, random, heapq, time, mmap, os, struct, sys, csv, json, re, sqlite3, shutil, tempfile
+import multiprocessing
+from collections import deque
+from queue import Empty
 import logging
+try:
+  import resource
+except ImportError: # not available on windows, peak RSS is reported as None there
+  resource = None
 
 class Heuristics:
   def _displacementHeuristic(state):
@@ -13,11 +19,7 @@ class Heuristics:
       count - The number of misplaced tiles in the state.
     ----------------------------------------------------------
     """
-    count = 0
-    for i in range(state.boardLength):
-      if state.board[i] != 0 and state.board[i] != i:
-        count += 1 
-    return count
+    return Heuristics._sumTileCosts(Heuristics.DISPLACEMENT, state)
   
   def _manhattanHeuristic(state):
     """
@@ -31,13 +33,8 @@ class Heuristics:
       h - The manhattan distance of the state.
     ----------------------------------------------------------
     """
-    h = 0
-    for i in range(state.boardLength):
-      if state.board[i] != 0:
-        x1, y1 = state._get2dCoord(i)
-        x2, y2 = state._get2dCoord(state.board[i])  
-        h += abs(x1 - x2) + abs(y1 - y2)
-    return h
+    return Heuristics._sumTileCosts(Heuristics.MANHATTAN, state)
+    
   def _outOfRowColoumnHeuristic(state):
     """
     ----------------------------------------------------------
@@ -50,16 +47,7 @@ class Heuristics:
       h - The number of tiles out of row or coloumn.
     ----------------------------------------------------------
     """
-    h = 0
-    for i in range(state.boardLength):
-      if state.board[i] != 0:
-        x1, y1 = state._get2dCoord(i)
-        x2, y2 = state._get2dCoord(state.board[i])  
-        if x1 != x2:
-          h += 1
-        if y1 != y2:
-          h += 1
-    return h
+    return Heuristics._sumTileCosts(Heuristics.ROWCOL, state)
   
   def _linearConflictHeuristic(state):
     """
@@ -73,32 +61,106 @@ class Heuristics:
       h - The linear conflict heuristic of the state.
     ----------------------------------------------------------
     """
-    h = 0
-    for i in range(state.boardLength):
-      if state.board[i] != 0:
-        x1, y1 = state._get2dCoord(i)
-        x2, y2 = state._get2dCoord(state.board[i]) 
-        h += abs(x1 - x2) + abs(y1 - y2) 
-        
-        if y1 == y2: # Tile is in the same row as it's goal tile
-          for j in range(state.boardLength): # Check if there is a tile in the same row that gives a linear conflict
-            if state.board[j] != 0:
-              x3, y3 = state._get2dCoord(j)
-              x4, y4 = state._get2dCoord(state.board[j])
-              if y3 == y1: # on the same row
-                if(x3 < x1 and x4 >= x1): # tile is in the way
-                  h += 2
-                  
-        if x1 == x2: # Tile is in the same coloumn as it's goal tile
-          for j in range(state.boardLength): # Check if there is a tile in the same coloumn that gives a linear conflict
-            if state.board[j] != 0:
-              x3, y3 = state._get2dCoord(j)
-              x4, y4 = state._get2dCoord(state.board[j])
-              if x3 == x1: # on the same col
-                if(y3 < y1 and y4 >= y1): # tile is in the way
-                  h += 2
+    width = int(state.width)
+    h = Heuristics._sumTileCosts(Heuristics.MANHATTAN, state)
+    for line in range(width):
+      h += Heuristics._rowConflicts(state.board[line * width:(line + 1) * width], line, width)
+      h += Heuristics._colConflicts(state.board[line::width], line, width)
     return h
-                  
+  
+  def _rowConflicts(tiles, row, width):
+    """
+    ----------------------------------------------------------
+    Description: Calculate the linear conflict penalty of a single row: two
+      moves for each tile that has to leave the row so the tiles whose goal
+      is in the row can pass each other.
+    Use: h += Heuristics._rowConflicts(board[0:4], 0, 4)
+    ----------------------------------------------------------
+    Parameters:
+      tiles - The tiles in the row, left to right.
+      row - The index of the row.
+      width - The width of the board.
+    Returns:
+      h - The linear conflict penalty of the row.
+    ----------------------------------------------------------
+    """
+    digits, penalties = Heuristics._lineTables(width)
+    n = width * width
+    code = 0
+    for tile in reversed(tiles):
+      code = code * (width + 1) + digits[row * n + tile]
+    return penalties[code]
+  
+  def _colConflicts(tiles, col, width):
+    """
+    ----------------------------------------------------------
+    Description: Calculate the linear conflict penalty of a single coloumn,
+      see Heuristics._rowConflicts.
+    Use: h += Heuristics._colConflicts(board[0::4], 0, 4)
+    ----------------------------------------------------------
+    Parameters:
+      tiles - The tiles in the coloumn, top to bottom.
+      col - The index of the coloumn.
+      width - The width of the board.
+    Returns:
+      h - The linear conflict penalty of the coloumn.
+    ----------------------------------------------------------
+    """
+    digits, penalties = Heuristics._lineTables(width)
+    n = width * width
+    code = 0
+    for tile in reversed(tiles):
+      code = code * (width + 1) + digits[(width + col) * n + tile]
+    return penalties[code]
+  
+  def _lineTables(width, goals=None):
+    """
+    ----------------------------------------------------------
+    Description: Precomputes the linear conflict penalty of every line. A line
+      is encoded base width + 1 with one digit per cell: the goal position
+      of the cell's tile along the line + 1 if its goal is in the line,
+      otherwise 0. The fewest tiles to remove so the rest are in goal order
+      is the number of such tiles minus their longest increasing run of goal
+      positions, and each removed tile costs 2 extra moves.
+    Use: digits, penalties = Heuristics._lineTables(4)
+    ----------------------------------------------------------
+    Parameters:
+      width - The width of the board.
+      goals - goals[tile] is the index tile has to reach, None for the goal
+        state (tile i at index i). Only the default is cached.
+    Returns:
+      digits - digits[line * width**2 + tile] is the digit of tile in line,
+        rows are lines 0 to width - 1 and coloumns width to 2 * width - 1.
+      penalties - penalties[code] is the penalty of the line encoded as code.
+    ----------------------------------------------------------
+    """
+    if goals == None and ("LINES", width) in Heuristics._tileTables:
+      return Heuristics._tileTables[("LINES", width)]
+    n = width * width
+    goalOf = goals if goals != None else range(n)
+    digits = [0] * (2 * width * n)
+    for tile in range(1, n):
+      digits[(goalOf[tile] // width) * n + tile] = goalOf[tile] % width + 1 # rows, ordered by goal coloumn
+      digits[(width + goalOf[tile] % width) * n + tile] = goalOf[tile] // width + 1 # coloumns, ordered by goal row
+    if ("LINES", width) in Heuristics._tileTables: # the penalties do not depend on the goal
+      return digits, Heuristics._tileTables[("LINES", width)][1]
+    penalties = bytearray((width + 1) ** width)
+    for code in range(len(penalties)):
+      lineGoals = []
+      rest = code
+      for i in range(width):
+        rest, digit = divmod(rest, width + 1)
+        if digit != 0:
+          lineGoals.append(digit - 1)
+      longest = [1] * len(lineGoals) # longest[i] is the longest increasing run ending at lineGoals[i]
+      for i in range(len(lineGoals)):
+        for j in range(i):
+          if lineGoals[j] < lineGoals[i] and longest[j] + 1 > longest[i]:
+            longest[i] = longest[j] + 1
+      penalties[code] = 2 * (len(lineGoals) - max(longest, default=0))
+    if goals == None:
+      Heuristics._tileTables[("LINES", width)] = (digits, penalties)
+    return digits, penalties
   
   def _euclideanHeuristic(state):
     """
@@ -112,14 +174,149 @@ class Heuristics:
       h - The euclidean distance of the state.
     ----------------------------------------------------------
     """
+    return Heuristics._sumTileCosts(Heuristics.EUCLIDEAN, state)
+  
+  def _patternDatabaseHeuristic(state):
+    """
+    ----------------------------------------------------------
+    Description: Calculate the sum of the disjoint pattern database costs of
+      the state. The tables must have been built with buildpdb.py.
+    Use: puzzles = Puzzle.randomizePuzzle(Heuristics.PATTERNDB, 15)
+    ----------------------------------------------------------
+    Parameters:
+      state - The state to calculate the heuristic from
+    Returns:
+      h - The number of moves of each pattern's tiles needed to put them in
+        place, summed over the patterns.
+    ----------------------------------------------------------
+    """
+    return PatternDatabase.load(int(state.width)).heuristic(state.board)
+  
+  def _sumTileCosts(func, state):
+    costs = Heuristics.tileTable(func, int(state.width))
     h = 0
     for i in range(state.boardLength):
-      if state.board[i] != 0:
-        x1, y1 = state._get2dCoord(i)
-        x2, y2 = state._get2dCoord(state.board[i])  
-        h += math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
+      h += costs[state.board[i] * state.boardLength + i]
     return h
   
+  def isIntegral(func):
+    return func != Heuristics._euclideanHeuristic
+  
+  def isAdmissible(func):
+    return func in (Heuristics.DISPLACEMENT, Heuristics.MANHATTAN, Heuristics.ROWCOL, Heuristics.EUCLIDEAN, Heuristics.LINEARCONFLICT, Heuristics.PATTERNDB) # never overestimate, so A* and IDA* solutions are optimal
+  
+  def isConsistent(func):
+    return func in (Heuristics.DISPLACEMENT, Heuristics.MANHATTAN, Heuristics.ROWCOL, Heuristics.EUCLIDEAN, Heuristics.LINEARCONFLICT) # change by at most 1 per move, the pattern databases can change by more as they leave the blank out
+  
+  def tileTable(func, width, goals=None):
+    """
+    ----------------------------------------------------------
+    Description: Precomputes the cost of every tile at every index for
+      heuristics that are a sum of independent per-tile costs.
+    Use: costs = Heuristics.tileTable(Heuristics.MANHATTAN, 4)
+    ----------------------------------------------------------
+    Parameters:
+      func - The heuristic to build the table for.
+      width - The width of the board.
+      goals - goals[tile] is the index tile has to reach, None for the goal
+        state (tile i at index i). Only the default is cached.
+    Returns:
+      costs - costs[tile * width**2 + index] is the cost of tile sitting at
+        index, the blank always costs 0. None if func is not a sum of
+        per-tile costs.
+    ----------------------------------------------------------
+    """
+    name = Heuristics.heuristicToStr(func)
+    if goals == None and (name, width) in Heuristics._tileTables:
+      return Heuristics._tileTables[(name, width)]
+    if name not in ("DISPLACEMENT", "MANHATTAN", "ROWCOL", "EUCLIDEAN"):
+      return None
+    costs = []
+    for tile in range(width * width):
+      goal = goals[tile] if goals != None else tile
+      for index in range(width * width):
+        x1, y1 = index % width, index // width
+        x2, y2 = goal % width, goal // width
+        if tile == 0:
+          costs.append(0)
+        elif name == "DISPLACEMENT":
+          costs.append(0 if goal == index else 1)
+        elif name == "MANHATTAN":
+          costs.append(abs(x1 - x2) + abs(y1 - y2))
+        elif name == "ROWCOL":
+          costs.append((1 if x1 != x2 else 0) + (1 if y1 != y2 else 0))
+        elif name == "EUCLIDEAN":
+          costs.append(math.sqrt((x1 - x2)**2 + (y1 - y2)**2))
+    if goals == None:
+      Heuristics._tileTables[(name, width)] = costs
+    return costs
+  
+  def getDelta(func, width, goals=None):
+    """
+    ----------------------------------------------------------
+    Description: Finds the incremental form of a heuristic, which gives the
+      heuristic of a child state from its parent's without rescanning the board.
+    Use: delta = Heuristics.getDelta(Heuristics.MANHATTAN, 4)
+         childH = delta(key, childKey, h, tile, fromIndex, toIndex)
+    ----------------------------------------------------------
+    Parameters:
+      func - The heuristic to find the incremental form of.
+      width - The width of the board.
+      goals - goals[tile] is the index tile has to reach, None for the goal
+        state (tile i at index i). Pattern databases only have the default.
+    Returns:
+      delta - Function of the parent's packed board, the child's packed
+        board, the parent's h, the moved tile and the index it moved from
+        and to, returning the child's h. None if func has no incremental form.
+    ----------------------------------------------------------
+    """
+    n = width * width
+    if func == Heuristics._patternDatabaseHeuristic:
+      if goals != None:
+        raise ValueError("pattern databases are only built for the goal state")
+      return PatternDatabase.load(width).delta
+    costs = Heuristics.tileTable(func, width, goals)
+    if costs != None:
+      def delta(key, childKey, h, tile, fromIndex, toIndex):
+        return h - costs[tile * n + fromIndex] + costs[tile * n + toIndex]
+      return delta
+    
+    if func == Heuristics._linearConflictHeuristic:
+      manhattan = Heuristics.tileTable(Heuristics.MANHATTAN, width, goals)
+      digits, penalties = Heuristics._lineTables(width, goals)
+      goalRows = [goal // width for goal in (goals if goals != None else range(n))]
+      goalCols = [goal % width for goal in (goals if goals != None else range(n))]
+      bits = State.bitsPerTile(n)
+      mask = (1 << bits) - 1
+      def rowPenalty(key, y):
+        code = 0
+        for i in range((y + 1) * width - 1, y * width - 1, -1):
+          code = code * (width + 1) + digits[y * n + ((key >> (bits * i)) & mask)]
+        return penalties[code]
+      def colPenalty(key, x):
+        code = 0
+        for i in range(n - width + x, -1, -width):
+          code = code * (width + 1) + digits[(width + x) * n + ((key >> (bits * i)) & mask)]
+        return penalties[code]
+      def delta(key, childKey, h, tile, fromIndex, toIndex):
+        # only lines that are the moved tile's goal row or coloumn can change, every other tile and the blank encode as 0
+        h += manhattan[tile * n + toIndex] - manhattan[tile * n + fromIndex]
+        goalRow = goalRows[tile]
+        goalCol = goalCols[tile]
+        if fromIndex // width == toIndex // width: # horizontal move, the row gets reordered and the tile changes coloumn
+          if goalRow == fromIndex // width:
+            h += rowPenalty(childKey, goalRow) - rowPenalty(key, goalRow)
+          if goalCol == fromIndex % width or goalCol == toIndex % width:
+            h += colPenalty(childKey, goalCol) - colPenalty(key, goalCol)
+        else: # vertical move, the coloumn gets reordered and the tile changes row
+          if goalCol == fromIndex % width:
+            h += colPenalty(childKey, goalCol) - colPenalty(key, goalCol)
+          if goalRow == fromIndex // width or goalRow == toIndex // width:
+            h += rowPenalty(childKey, goalRow) - rowPenalty(key, goalRow)
+        return h
+      return delta
+    return None
+  
   def strToHeuristic(str):
     if (str == "DISPLACEMENT"):
       return Heuristics.DISPLACEMENT
@@ -131,6 +328,8 @@ class Heuristics:
       return Heuristics.LINEARCONFLICT
     elif (str == "EUCLIDEAN"):
       return Heuristics.EUCLIDEAN
+    elif (str == "PATTERNDB"):
+      return Heuristics.PATTERNDB
     
   def heuristicToStr(func):
     if func == Heuristics._displacementHeuristic:
@@ -143,12 +342,590 @@ class Heuristics:
       return "LINEARCONFLICT"
     elif func == Heuristics._euclideanHeuristic:
       return "EUCLIDEAN"
+    elif func == Heuristics._patternDatabaseHeuristic:
+      return "PATTERNDB"
   
   DISPLACEMENT = _displacementHeuristic
   MANHATTAN = _manhattanHeuristic
   ROWCOL = _outOfRowColoumnHeuristic
   EUCLIDEAN = _euclideanHeuristic
   LINEARCONFLICT = _linearConflictHeuristic
+  PATTERNDB = _patternDatabaseHeuristic
+  
+  _tileTables = {}
+
+class PatternDatabase:
+  """
+  ----------------------------------------------------------
+  Description: Disjoint additive pattern databases. Each pattern is a group
+    of tiles, and its table holds the fewest moves of those tiles (moves of
+    other tiles are free) needed to put them in their goal positions, for
+    every placement of the group. Tables are indexed by
+    sum(position[i] * boardLength**i) over the group's tiles, one byte per
+    entry, which leaves entries for placements with two tiles on one square
+    unused but is worked out in the same single pass over the board as the
+    other heuristics, with no permutation ranking.
+  Use: db = PatternDatabase.build(4, PatternDatabase.PARTITIONS[15]["5-5-5"])
+       db.save(PatternDatabase.defaultPath(15, "5-5-5"))
+  ----------------------------------------------------------
+  """
+  MAGIC = b"NPDB"
+  VERSION = 1
+  # header is magic, version, board width, number of patterns, then each pattern as its size and tiles
+  HEADER = "<4sHBB"
+  PARTITIONS = {
+    8: {"4-4": [[1, 2, 3, 4], [5, 6, 7, 8]]},
+    15: {
+      "5-5-5": [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12, 13, 14, 15]],
+      "6-6-3": [[1, 4, 5, 8, 9, 12], [2, 3, 6, 7, 10, 11], [13, 14, 15]]
+    }
+  } # no 24-puzzle partition, a 6 tile 24-puzzle table has 25**7 abstract states, too many to search in Python
+  DIRECTORY = "./pdb/"
+  _loaded = {}
+  
+  def __init__(self, width, patterns, tables, path=None):
+    self.path = path
+    self.width = width
+    self.boardLength = width * width
+    self.patterns = patterns
+    self.tables = tables
+    self.bits = State.bitsPerTile(self.boardLength)
+    self.patternOf = [-1] * self.boardLength # which pattern each tile belongs to
+    self.weightOf = [0] * self.boardLength # how much the tile's position is worth in its pattern's index
+    for p in range(len(patterns)):
+      for i in range(len(patterns[p])):
+        self.patternOf[patterns[p][i]] = p
+        self.weightOf[patterns[p][i]] = self.boardLength ** i
+  
+  def heuristic(self, board):
+    indices = [0] * len(self.patterns)
+    for i in range(self.boardLength):
+      if board[i] != 0:
+        indices[self.patternOf[board[i]]] += i * self.weightOf[board[i]]
+    h = 0
+    for p in range(len(self.patterns)):
+      h += self.tables[p][indices[p]]
+    return h
+  
+  def delta(self, key, childKey, h, tile, fromIndex, toIndex):
+    """
+    ----------------------------------------------------------
+    Description: Child form of the heuristic, see Heuristics.getDelta. Only
+      the moved tile's pattern changes, so only its entry is looked up again,
+      but the board is still decoded to find that pattern's index, so this
+      is O(n) per child like a full evaluation.
+    ----------------------------------------------------------
+    """
+    p = self.patternOf[tile]
+    patternOf = self.patternOf
+    weightOf = self.weightOf
+    mask = (1 << self.bits) - 1
+    index = 0
+    for i in range(self.boardLength):
+      t = key & mask
+      if patternOf[t] == p:
+        index += i * weightOf[t]
+      key >>= self.bits
+    table = self.tables[p]
+    return h - table[index] + table[index + (toIndex - fromIndex) * weightOf[tile]]
+  
+  def build(width, patterns, debug=False):
+    """
+    ----------------------------------------------------------
+    Description: Builds the tables of a partition by breadth first search
+      backwards from the goal over abstract states (the group's positions
+      and the blank's position).
+    Use: db = PatternDatabase.build(3, [[1, 2, 3, 4], [5, 6, 7, 8]])
+    ----------------------------------------------------------
+    Parameters:
+      width - The width of the board.
+      patterns - The groups of tiles, every tile except the blank exactly once.
+      debug - Whether or not to print progress.
+    Returns:
+      db - The pattern database, tables held in memory.
+    ----------------------------------------------------------
+    """
+    tables = []
+    for tiles in patterns:
+      start = time.time()
+      tables.append(PatternDatabase._buildTable(width, tiles))
+      if debug: print("pattern {}:\t{:.2f}s".format(tiles, time.time() - start))
+    return PatternDatabase(width, patterns, tables)
+  
+  def _buildTable(width, tiles):
+    n = width * width
+    k = len(tiles)
+    weights = [n ** i for i in range(k)]
+    neighbours = State.neighbourTable(width)
+    table = bytearray(b"\xff") * (n ** k)
+    seen = bytearray((n ** k) * n // 8 + 1) # one bit per (index, blank) abstract state
+    queued = bytearray(len(seen)) # states already in the next layer, so each is only added once
+    layer = [sum(tiles[i] * weights[i] for i in range(k)) * n] # goal placement with the blank at index 0
+    moves = 0
+    while len(layer) != 0:
+      nextLayer = []
+      for state in layer:
+        if seen[state >> 3] & (1 << (state & 7)):
+          continue
+        index, blank = divmod(state, n)
+        occupied = [-1] * n
+        rest = index
+        for i in range(k):
+          rest, position = divmod(rest, n)
+          occupied[position] = i
+        if table[index] > moves:
+          table[index] = moves
+        # the blank moves freely among the other tiles, so flood its region at no cost
+        seen[state >> 3] |= 1 << (state & 7)
+        region = [blank]
+        while len(region) != 0:
+          b = region.pop()
+          for nb in neighbours[b]:
+            i = occupied[nb]
+            if i == -1:
+              s = index * n + nb
+              if not seen[s >> 3] & (1 << (s & 7)):
+                seen[s >> 3] |= 1 << (s & 7)
+                region.append(nb)
+            else: # sliding one of the group's tiles into the blank costs a move
+              s = (index + (b - nb) * weights[i]) * n + nb
+              if not (seen[s >> 3] | queued[s >> 3]) & (1 << (s & 7)):
+                queued[s >> 3] |= 1 << (s & 7)
+                nextLayer.append(s)
+      layer = nextLayer
+      moves += 1
+    return table
+  
+  def save(self, path):
+    directory = os.path.dirname(path)
+    if directory != "":
+      os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as file:
+      file.write(struct.pack(PatternDatabase.HEADER, PatternDatabase.MAGIC, PatternDatabase.VERSION, self.width, len(self.patterns)))
+      for tiles in self.patterns:
+        file.write(bytes([len(tiles)] + tiles))
+      for table in self.tables:
+        file.write(table)
+  
+  def open(path):
+    """
+    ----------------------------------------------------------
+    Description: Memory-maps a pattern database file. The pages are shared
+      with every other process that maps the same file.
+    Use: db = PatternDatabase.open("./pdb/15-5-5-5.pdb")
+    ----------------------------------------------------------
+    Returns:
+      db - The pattern database.
+    ----------------------------------------------------------
+    """
+    with open(path, "rb") as file:
+      data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, width, numPatterns = struct.unpack_from(PatternDatabase.HEADER, data)
+    if magic != PatternDatabase.MAGIC or version != PatternDatabase.VERSION:
+      raise ValueError("{} is not a version {} pattern database, rebuild it with buildpdb.py".format(path, PatternDatabase.VERSION))
+    offset = struct.calcsize(PatternDatabase.HEADER)
+    patterns = []
+    for p in range(numPatterns):
+      k = data[offset]
+      patterns.append(list(data[offset + 1:offset + 1 + k]))
+      offset += 1 + k
+    tables = []
+    view = memoryview(data)
+    for tiles in patterns:
+      size = (width * width) ** len(tiles)
+      tables.append(view[offset:offset + size])
+      offset += size
+    return PatternDatabase(width, patterns, tables, path)
+  
+  def use(path):
+    db = PatternDatabase.open(path)
+    PatternDatabase._loaded[db.width] = db
+    return db
+  
+  def _openPaths():
+    return [db.path for db in PatternDatabase._loaded.values()]
+  
+  def _useAll(paths):
+    for path in paths: # lets worker processes map the same files as their parent
+      PatternDatabase.use(path)
+  
+  def load(width):
+    """
+    ----------------------------------------------------------
+    Description: Finds the pattern database for the given board width, opening
+      the default partition's file the first time it is needed.
+    Use: db = PatternDatabase.load(4)
+    ----------------------------------------------------------
+    """
+    db = PatternDatabase._loaded.get(width)
+    if db == None:
+      size = width * width - 1
+      if size not in PatternDatabase.PARTITIONS:
+        raise ValueError("No pattern database partition for the {}-puzzle".format(size))
+      partition = next(iter(PatternDatabase.PARTITIONS[size]))
+      path = PatternDatabase.defaultPath(size, partition)
+      if not os.path.exists(path):
+        raise FileNotFoundError("{} not found, build it with 'python buildpdb.py -s {} -P {}'".format(path, size, partition))
+      db = PatternDatabase.use(path)
+    return db
+  
+  def defaultPath(size, partition):
+    return PatternDatabase.DIRECTORY + "{}-{}.pdb".format(size, partition)
+
+class BucketQueue:
+  """
+  ----------------------------------------------------------
+  Description: Priority queue for integer f values. Entries are kept in a
+    stack per (f, tie) pair, popped lowest f first, then lowest tie, then
+    most recently pushed first. Push and pop are O(1) apart from skipping
+    empty buckets, which only happens as the lowest f moves up.
+  Use: frontier = BucketQueue()
+       frontier.push(f, h, entry)
+       entry = frontier.pop()
+  ----------------------------------------------------------
+  """
+  def __init__(self):
+    self.buckets = [] # buckets[f][tie] is a stack of entries
+    self.minTie = [] # minTie[f] is a lower bound on the lowest non-empty tie of buckets[f]
+    self.minF = 0
+    self.size = 0
+  
+  def __len__(self):
+    return self.size
+  
+  def push(self, f, tie, entry):
+    while len(self.buckets) <= f:
+      self.buckets.append([])
+      self.minTie.append(0)
+    bucket = self.buckets[f]
+    while len(bucket) <= tie:
+      bucket.append([])
+    bucket[tie].append(entry)
+    if tie < self.minTie[f]:
+      self.minTie[f] = tie
+    if f < self.minF: # only happens with inconsistent heuristics
+      self.minF = f
+    self.size += 1
+  
+  def pop(self):
+    while True:
+      bucket = self.buckets[self.minF]
+      tie = self.minTie[self.minF]
+      while tie < len(bucket) and len(bucket[tie]) == 0:
+        tie += 1
+      if tie < len(bucket):
+        self.minTie[self.minF] = tie
+        self.size -= 1
+        return bucket[tie].pop()
+      self.minTie[self.minF] = tie
+      self.minF += 1
+  
+  def minimum(self):
+    if self.size == 0:
+      return math.inf
+    while True: # same scan as pop, without taking the entry
+      bucket = self.buckets[self.minF]
+      tie = self.minTie[self.minF]
+      while tie < len(bucket) and len(bucket[tie]) == 0:
+        tie += 1
+      self.minTie[self.minF] = tie
+      if tie < len(bucket):
+        return self.minF
+      self.minF += 1
+
+class HeapQueue:
+  """
+  ----------------------------------------------------------
+  Description: Binary heap with the same ordering as BucketQueue, for f
+    values that are not integers.
+  Use: frontier = HeapQueue()
+  ----------------------------------------------------------
+  """
+  def __init__(self):
+    self.heap = []
+    self.count = 0
+  
+  def __len__(self):
+    return len(self.heap)
+  
+  def push(self, f, tie, entry):
+    self.count += 1
+    heapq.heappush(self.heap, (f, tie, -self.count, entry)) # -count makes equal (f, tie) pop most recent first
+  
+  def pop(self):
+    return heapq.heappop(self.heap)[3]
+  
+  def minimum(self):
+    return self.heap[0][0] if len(self.heap) != 0 else math.inf
+
+class SearchMetrics:
+  """
+  ----------------------------------------------------------
+  Description: Opt-in instrumentation for one search. Counts expansions per
+    f-layer, duplicate and stale pops, re-expansions and the time spent on
+    the heuristic, move generation and queue operations, and writes a
+    sample to a JSON Lines file every interval expansions.
+  Use: metrics = SearchMetrics("./output/metrics/1.jsonl", 10000)
+       stats = Puzzle.solvePuzzle(puzzle, metrics=metrics)
+       stats["metrics"] # the summary
+  ----------------------------------------------------------
+  Parameters:
+    path - The JSON Lines file to write samples to, or None to not write any.
+    interval - The number of expansions between samples.
+    echo - Whether or not to print each sample as well.
+  ----------------------------------------------------------
+  """
+  def __init__(self, path=None, interval=10000, echo=False):
+    self.path = path
+    self.interval = interval
+    self.echo = echo
+    self.file = None # opened on the first sample, so unused metrics can be sent to worker processes
+    self.begin()
+    self.expanded = 0
+    self.layers = {} # f -> expansions
+    self.duplicatePops = 0 # popped states already expanded at the same g
+    self.stalePops = 0 # popped states already expanded at a lower g
+    self.reopened = 0 # states expanded again at a lower g
+    self.heuristicTime = 0.0
+    self.moveTime = 0.0
+    self.queueTime = 0.0
+    self.peakFrontier = 0
+    self.peakExplored = 0
+
+  SUMMARY = ["peakFrontier", "peakExplored", "duplicatePops", "stalePops", "reopened", "heuristicTime", "moveTime", "queueTime", "peakRSS"]
+
+  CSV_HEADER = "Peak Frontier,Peak Explored,Duplicate Pops,Stale Pops,Reopened,Heuristic Time,Move Generation Time,Queue Time,Peak RSS"
+
+  def begin(self):
+    self.start = time.perf_counter()
+    self.mark = self.start # end of the last timed expansion, the time since is spent on queue operations
+
+  def skipped(self, exploredG, g):
+    if exploredG == g:
+      self.duplicatePops += 1
+    else:
+      self.stalePops += 1
+
+  def expand(self, f, frontierSize, exploredSize):
+    self.expanded += 1
+    self.layers[f] = self.layers.get(f, 0) + 1
+    if self.expanded % self.interval == 0:
+      self.sample(f, frontierSize, exploredSize)
+
+  def sample(self, f, frontierSize, exploredSize, final=False):
+    """
+    ----------------------------------------------------------
+    Description: Records the current state of the search.
+    Use: metrics.sample(f, len(frontier), len(explored))
+    ----------------------------------------------------------
+    Parameters:
+      f - The f-layer being expanded.
+      frontierSize - The number of entries in the open list.
+      exploredSize - The number of entries in the explored table.
+      final - Whether or not this is the last sample, which also holds the
+        expansions per f-layer.
+    ----------------------------------------------------------
+    """
+    self.peakFrontier = max(self.peakFrontier, frontierSize)
+    self.peakExplored = max(self.peakExplored, exploredSize)
+    record = {
+      "elapsed": time.perf_counter() - self.start,
+      "expanded": self.expanded,
+      "f": f,
+      "frontier": frontierSize,
+      "explored": exploredSize,
+      "duplicatePops": self.duplicatePops,
+      "stalePops": self.stalePops,
+      "reopened": self.reopened,
+      "heuristicTime": self.heuristicTime,
+      "moveTime": self.moveTime,
+      "queueTime": self.queueTime,
+      "peakRSS": SearchMetrics.peakRSS()
+    }
+    if final:
+      record["layers"] = {str(layer): count for layer, count in sorted(self.layers.items())}
+    if self.path != None:
+      if self.file == None:
+        directory = os.path.dirname(self.path)
+        if directory != "":
+          os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "w")
+      self.file.write(json.dumps(record) + "\n")
+    if self.echo:
+      print("f:\t {}\t#expanded:\t {}\t#frontier:\t {}\t#explored:\t {}\tnps:\t {:.2f}".format(f, self.expanded, frontierSize, exploredSize, self.expanded / max(record["elapsed"], 0.01)))
+
+  def finish(self, f, frontierSize, exploredSize):
+    """
+    ----------------------------------------------------------
+    Description: Writes the final sample and closes the samples file.
+    Use: stats["metrics"] = metrics.finish(f, len(frontier), len(explored))
+    ----------------------------------------------------------
+    Returns:
+      summary - Dictionary of the SearchMetrics.SUMMARY values for the search.
+    ----------------------------------------------------------
+    """
+    self.sample(f, frontierSize, exploredSize, final=True)
+    if self.file != None:
+      self.file.close()
+      self.file = None
+    summary = {name: getattr(self, name) for name in SearchMetrics.SUMMARY if name != "peakRSS"}
+    summary["peakRSS"] = SearchMetrics.peakRSS()
+    return summary
+
+  def peakRSS():
+    """
+    ----------------------------------------------------------
+    Description: The peak resident set size of this process so far.
+    Use: rss = SearchMetrics.peakRSS()
+    ----------------------------------------------------------
+    Returns:
+      rss - The peak RSS in bytes, or None where it is not available.
+    ----------------------------------------------------------
+    """
+    if resource == None:
+      return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024 # bytes on macOS, KiB elsewhere
+  
+  def currentRSS():
+    """
+    ----------------------------------------------------------
+    Description: The resident set size of this process right now, read from
+      /proc where there is one and falling back to the peak otherwise.
+    Use: rss = SearchMetrics.currentRSS()
+    ----------------------------------------------------------
+    Returns:
+      rss - The RSS in bytes, or None where it is not available.
+    ----------------------------------------------------------
+    """
+    try:
+      with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+      return SearchMetrics.peakRSS()
+
+class SolutionCache:
+  """
+  ----------------------------------------------------------
+  Description: Solutions stored in a SQLite file so boards solved by an
+    earlier run are not searched again. A board and its reflection about
+    the main diagonal, with every tile relabelled to its reflected goal
+    position, have the same goal and mirrored solutions, so both are stored
+    under whichever of the two boards is smaller. Holds at most maxEntries
+    solutions, evicting the least recently used.
+  Use: cache = SolutionCache("./cache/solutions.sqlite")
+       stats = Puzzle.solvePuzzle(puzzle, cache=cache)
+  ----------------------------------------------------------
+  Parameters:
+    path - The SQLite file, created if it does not exist.
+    maxEntries - The most solutions to keep.
+  ----------------------------------------------------------
+  """
+  DEFAULT_PATH = "./cache/solutions.sqlite"
+  
+  _connections = {} # path -> [connection, number of entries], opened once per process
+  
+  def __init__(self, path=DEFAULT_PATH, maxEntries=1000000):
+    self.path = path # only the path is kept, so caches can be sent to worker processes
+    self.maxEntries = maxEntries
+  
+  def _connect(self):
+    if self.path not in SolutionCache._connections:
+      directory = os.path.dirname(self.path)
+      if directory != "":
+        os.makedirs(directory, exist_ok=True)
+      connection = sqlite3.connect(self.path, timeout=60, isolation_level=None) # autocommit, workers share the file
+      connection.execute("PRAGMA journal_mode=WAL")
+      connection.execute("CREATE TABLE IF NOT EXISTS solutions (board TEXT PRIMARY KEY, path TEXT NOT NULL, optimal INTEGER NOT NULL, heuristic TEXT NOT NULL, nodes INTEGER NOT NULL, lastUsed REAL NOT NULL)")
+      connection.execute("CREATE INDEX IF NOT EXISTS solutionsLastUsed ON solutions (lastUsed)")
+      count = connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+      SolutionCache._connections[self.path] = [connection, count]
+    return SolutionCache._connections[self.path]
+  
+  def canonical(board, width):
+    """
+    ----------------------------------------------------------
+    Description: Picks the board the given board is stored under.
+    Use: board, reflected = SolutionCache.canonical(s.board, 4)
+    ----------------------------------------------------------
+    Parameters:
+      board - The tiles of the board.
+      width - The width of the board.
+    Returns:
+      board - The smaller of the board and its reflection.
+      reflected - Whether or not it is the reflection, in which case paths
+        have to be relabelled with SolutionCache.reflectPath.
+    ----------------------------------------------------------
+    """
+    reflect = [(i % width) * width + i // width for i in range(width * width)] # the goal tile at an index is the index, so positions and tiles reflect alike
+    reflected = [0] * len(board)
+    for index, tile in enumerate(board):
+      reflected[reflect[index]] = reflect[tile]
+    if reflected < board:
+      return reflected, True
+    return list(board), False
+  
+  def reflectPath(path, width):
+    return [(tile % width) * width + tile // width for tile in path]
+  
+  def lookup(self, board, width, optimal=True):
+    """
+    ----------------------------------------------------------
+    Description: Finds a stored solution of the board.
+    Use: path = cache.lookup(s.board, 4)
+    ----------------------------------------------------------
+    Parameters:
+      board - The tiles of the board.
+      width - The width of the board.
+      optimal - Whether or not only a solution found by an optimal search
+        will do.
+    Returns:
+      path - The tiles moved to solve the board, or None if there is no
+        suitable stored solution.
+    ----------------------------------------------------------
+    """
+    connection = self._connect()[0]
+    key, reflected = SolutionCache.canonical(board, width)
+    key = "-".join(map(str, key))
+    row = connection.execute("SELECT path, optimal FROM solutions WHERE board = ?", (key,)).fetchone()
+    if row == None or (optimal and not row[1]):
+      return None
+    connection.execute("UPDATE solutions SET lastUsed = ? WHERE board = ?", (time.time(), key))
+    path = [int(tile) for tile in row[0].split("-")] if row[0] != "" else []
+    return SolutionCache.reflectPath(path, width) if reflected else path
+  
+  def record(self, board, width, path, optimal, heuristic, nodes):
+    """
+    ----------------------------------------------------------
+    Description: Stores a solution of the board, unless an optimal one is
+      already stored. Evicts the least recently used solutions once there
+      are more than maxEntries.
+    Use: cache.record(s.board, 4, stats["pathToSolution"], True, "MANHATTAN", 1000)
+    ----------------------------------------------------------
+    Parameters:
+      board - The tiles of the board.
+      width - The width of the board.
+      path - The tiles moved to solve the board.
+      optimal - Whether or not the search that found it was optimal, only
+        optimal solutions are served to searches that need them.
+      heuristic - The name of the heuristic the search used.
+      nodes - The number of nodes the search expanded.
+    ----------------------------------------------------------
+    """
+    entry = self._connect()
+    connection = entry[0]
+    key, reflected = SolutionCache.canonical(board, width)
+    if reflected:
+      path = SolutionCache.reflectPath(path, width)
+    cursor = connection.execute(
+      "INSERT INTO solutions VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (board) DO UPDATE SET path = excluded.path, optimal = excluded.optimal, heuristic = excluded.heuristic, nodes = excluded.nodes, lastUsed = excluded.lastUsed WHERE NOT solutions.optimal",
+      ("-".join(map(str, key)), "-".join(map(str, path)), int(optimal), heuristic, nodes, time.time()))
+    entry[1] += cursor.rowcount # counts updates too, which only makes the eviction check early
+    if entry[1] > self.maxEntries:
+      entry[1] = connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0] # other processes may have evicted already
+      if entry[1] > self.maxEntries:
+        connection.execute("DELETE FROM solutions WHERE board IN (SELECT board FROM solutions ORDER BY lastUsed LIMIT ?)", (entry[1] - self.maxEntries,))
+        entry[1] = self.maxEntries
 
 class Puzzle:
   def __init__():
@@ -183,19 +960,148 @@ class Puzzle:
       print("ERROR:\t Size must be a perfect square!")
       return
     
-  def solvePuzzleArray(puzzles, outputFile, outputCSV, debug=False):
+  def optimalLengths(width):
+    """
+    ----------------------------------------------------------
+    Description: The optimal solution length of every solvable board of the
+      given width, found by breadth first search back from the goal. Only
+      practical up to the 8-puzzle (181440 boards).
+    Use: lengths = Puzzle.optimalLengths(3)
+    ----------------------------------------------------------
+    Returns:
+      lengths - Dictionary of packed board (see State.toKey) to the length
+        of its optimal solution.
+    ----------------------------------------------------------
+    """
+    n = width * width
+    bits = State.bitsPerTile(n)
+    mask = (1 << bits) - 1
+    neighbours = State.neighbourTable(width)
+    distances = {State.goalKey(n): 0}
+    layer = [(State.goalKey(n), 0)]
+    depth = 0
+    while len(layer) != 0:
+      depth += 1
+      nextLayer = []
+      for key, blank in layer:
+        for index in neighbours[blank]:
+          tile = (key >> (bits * index)) & mask
+          childKey = key + (tile << (bits * blank)) - (tile << (bits * index))
+          if childKey not in distances:
+            distances[childKey] = depth
+            nextLayer.append((childKey, index))
+      layer = nextLayer
+    return distances
+  
+  def readPuzzles(path, heuristic, fileFormat="auto"):
+    """
+    ----------------------------------------------------------
+    Description: Lazily reads puzzles from a file, one per line, so memory
+      does not depend on the number of puzzles. CSV files either have a
+      Puzzle column (as written by solvePuzzleArray, e.g. 7-11-0-8-...) or
+      one board per line. JSONL lines are a list of tiles or an object with
+      a "puzzle" or "board" key holding a list or a board string.
+    Use: puzzles = Puzzle.readPuzzles("./100linear15.csv", Heuristics.MANHATTAN)
+    ----------------------------------------------------------
+    Parameters:
+      path - The file to read, or "-" for stdin.
+      heuristic - The heuristic to use for the puzzles.
+      fileFormat - "csv", "jsonl" or "auto" to go by the file extension, or
+        by the first line for stdin.
+    Yields:
+      puzzle - A State for each valid board, or an InvalidPuzzle for each
+        malformed or unsolvable one.
+    ----------------------------------------------------------
+    """
+    if fileFormat == "auto" and path != "-":
+      fileFormat = "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".json", ".ndjson") else "csv"
+    file = sys.stdin if path == "-" else open(path, newline="")
+    try:
+      column = None # index of the Puzzle column, None when the lines are bare boards
+      for lineNumber, line in enumerate(file, 1):
+        text = line.strip()
+        if text == "":
+          continue
+        if fileFormat == "auto":
+          fileFormat = "jsonl" if text[0] in "[{" else "csv"
+        try:
+          if fileFormat == "jsonl":
+            record = json.loads(text)
+            if isinstance(record, dict):
+              record = record["puzzle"] if "puzzle" in record else (record["Puzzle"] if "Puzzle" in record else record["board"])
+            board = Puzzle.parseBoard(record)
+          else:
+            row = next(csv.reader([text]))
+            if lineNumber == 1 and "puzzle" in [name.strip().lower() for name in row]:
+              column = [name.strip().lower() for name in row].index("puzzle")
+              continue
+            board = Puzzle.parseBoard(row[column] if column != None else text)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+          yield InvalidPuzzle(lineNumber, text, "malformed: " + (str(e) if not isinstance(e, KeyError) else "no puzzle or board key"))
+          continue
+        puzzle = State(board, int(math.sqrt(len(board))), heuristic=heuristic)
+        if not puzzle.isSolvable():
+          yield InvalidPuzzle(lineNumber, text, "unsolvable")
+          continue
+        yield puzzle
+    finally:
+      if file is not sys.stdin:
+        file.close()
+  
+  def parseBoard(value):
+    """
+    ----------------------------------------------------------
+    Description: Parses and validates a board.
+    Use: board = Puzzle.parseBoard("7-11-0-8-1-2-3-9-14-6-5-10-13-15-4-12")
+    ----------------------------------------------------------
+    Parameters:
+      value - A list of tiles, or a string of tiles separated by -, commas
+        or whitespace.
+    Returns:
+      board - The list of tiles. Raises ValueError if it is not a
+        permutation of 0 to n on a square board.
+    ----------------------------------------------------------
+    """
+    if isinstance(value, str):
+      board = [int(tile) for tile in re.split(r"[-,\s]+", value.strip())]
+    elif isinstance(value, list) and all(isinstance(tile, int) and not isinstance(tile, bool) for tile in value):
+      board = value
+    else:
+      raise ValueError("expected a list of tiles or a board string")
+    width = math.isqrt(len(board))
+    if width < 2 or width * width != len(board) or len(board) >= 2 ** Puzzle.PARENT_BITS:
+      raise ValueError("{} tiles is not a supported square board".format(len(board)))
+    if sorted(board) != list(range(len(board))):
+      raise ValueError("tiles must be 0 to {} each exactly once".format(len(board) - 1))
+    return board
+  
+  def solvePuzzleArray(puzzles, outputFile, outputCSV, debug=False, solver=None, workers=1, metricsDir=None, metricsInterval=10000):
     """
     ----------------------------------------------------------
     Description: Solves the given puzzles and writes the results to the given file.
     Use: Puzzle.solvePuzzles(puzzles)
     ----------------------------------------------------------
     Parameters:
-      puzzles - An array of puzzles to solve.
+      puzzles - An iterable of puzzles to solve, which may include
+        InvalidPuzzle entries to report and skip. It is consumed lazily.
+      solver - The search to solve them with, Puzzle.solvePuzzle (A*) by default.
+      workers - The number of processes to solve puzzles in. Results are
+        still written in puzzle order.
+      metricsDir - The directory in ./output to write a SearchMetrics samples
+        file per puzzle to, None to not record metrics. Their summaries are
+        added to the CSV.
+      metricsInterval - The number of expansions between samples.
     Yields:
       count - The current number of puzzles solved.
     ----------------------------------------------------------
     """
+    if solver == None:
+      solver = Puzzle.solvePuzzle
     count = 1
+    numSolved = 0
+    numTimedOut = 0
+    numCached = 0
+    sizes = set()
     totalStats = {
       'timeTaken': 0,
       'numNodesExplored': 0,
@@ -203,55 +1109,169 @@ class Puzzle:
       'nodesPerSecond': 0
     }
     file = open("./output/" + outputFile, "w")
-    fStats = open("./output/" + outputCSV, "w")
-    fStats.write("Puzzle ID,Puzzle,Time Taken,Nodes Explored,Steps to Solution,Nodes per Second\n") # write header
-    for puzzle in puzzles:
+    fStats = open("./output/" + outputCSV, "w", newline="")
+    writer = csv.writer(fStats, lineterminator="\n") # quotes fields with commas, e.g. error reasons
+    newMetrics = None
+    if metricsDir != None:
+      metricsPath = os.path.join("./output", metricsDir, os.path.splitext(outputCSV)[0] + "_{}.jsonl")
+      newMetrics = lambda count: SearchMetrics(metricsPath.format(count), metricsInterval)
+    writer.writerow(["Puzzle ID", "Puzzle", "Time Taken", "Nodes Explored", "Steps to Solution", "Nodes per Second", "Bound", "Suboptimality", "Status", "Cached", "Error"] + (SearchMetrics.CSV_HEADER.split(",") if newMetrics != None else [])) # write header
+    for puzzle, stats in Puzzle._solveAll(puzzles, solver, debug, workers, newMetrics):
       file.write("-"*150 + "\n")
+      if isinstance(puzzle, InvalidPuzzle): # report it and carry on with the rest
+        file.write(" Puzzle # " + str(count) + " | " + str(puzzle) + "\n")
+        writer.writerow([count, puzzle.text] + [""] * 8 + [puzzle.reason] + ([""] * len(SearchMetrics.SUMMARY) if newMetrics != None else []))
+        print("WARNING:\t Puzzle # " + str(count) + " skipped, " + str(puzzle))
+        yield
+        count += 1
+        file.flush()
+        fStats.flush()
+        continue
       file.write(" Puzzle # " + str(count) + " | " + str(puzzle.board) + "\n")
-      file.flush()
-      stats = Puzzle.solvePuzzle(puzzle, debug)
-      
-      # Update total stats
-      totalStats["numNodesExplored"] += stats["numNodesExplored"]
-      totalStats["timeTaken"] += stats["timeTaken"]
-      totalStats["nodesPerSecond"] += stats["nodesPerSecond"]
-      totalStats["numStepsToSolution"] += len(stats["pathToSolution"])
-      
-      # Write to file
-      file.write("\t{:<30} ---> {:.2f}s \n".format("Time taken to complete puzzle:",stats["timeTaken"]))
-      file.write("\t{:<30} ---> {} \n".format("Number of expanded nodes:",str(stats["numNodesExplored"])))
-      file.write("\t{:<30} ---> {} \n".format("Number of steps to solution:",str(len(stats["pathToSolution"]))))
-      file.write("\t{:<30} ---> {} \n".format("Path to Solution:",str(stats["pathToSolution"])))
-      file.write("\t{:<30} ---> {:.2f} nodes/s \n".format("Nodes expanded per second:",stats["nodesPerSecond"]))
-      fStats.write('%s,%s,%s,%s,%s,%s\n' % (str(count),str(stats["startingBoard"]),str(stats["timeTaken"]),str(stats["numNodesExplored"]),str(len(stats["pathToSolution"])),str(stats["nodesPerSecond"])))
+      sizes.add(puzzle.boardLength - 1)
+      if stats["status"] == "timeout": # out of budget before any solution, only the partial path is reported
+        numTimedOut += 1
+        file.write("\t{:<30} ---> {:.2f}s \n".format("Out of budget after:",stats["timeTaken"]))
+        file.write("\t{:<30} ---> {} \n".format("Number of expanded nodes:",str(stats["numNodesExplored"])))
+        file.write("\t{:<30} ---> {} \n".format("Partial path:",str(stats["pathToSolution"])))
+        file.write("\t{:<30} ---> {} \n".format("Lower bound on solution:",str(stats["bound"])))
+        print("WARNING:\t Puzzle # " + str(count) + " ran out of budget without a solution")
+      else:
+        if stats.get("cached", False): # no search was run, so it would drag the averages towards 0
+          numCached += 1
+        else:
+          numSolved += 1
+          
+          # Update total stats
+          totalStats["numNodesExplored"] += stats["numNodesExplored"]
+          totalStats["timeTaken"] += stats["timeTaken"]
+          totalStats["nodesPerSecond"] += stats["nodesPerSecond"]
+          totalStats["numStepsToSolution"] += len(stats["pathToSolution"])
+        
+        # Write to file
+        file.write("\t{:<30} ---> {:.2f}s \n".format("Time taken to complete puzzle:",stats["timeTaken"]))
+        file.write("\t{:<30} ---> {} \n".format("Number of expanded nodes:",str(stats["numNodesExplored"])))
+        file.write("\t{:<30} ---> {} \n".format("Number of steps to solution:",str(len(stats["pathToSolution"]))))
+        file.write("\t{:<30} ---> {} \n".format("Path to Solution:",str(stats["pathToSolution"])))
+        file.write("\t{:<30} ---> {:.2f} nodes/s \n".format("Nodes expanded per second:",stats["nodesPerSecond"]))
+        if stats["status"] != "optimal":
+          file.write("\t{:<30} ---> {:.3f} (lower bound {}) \n".format("Suboptimality at most:",stats["suboptimality"],stats["bound"]))
+        if stats.get("cached", False):
+          file.write("\t{:<30} ---> {} \n".format("Solution from cache:","yes"))
+      row = [count, stats["startingBoard"], stats["timeTaken"], stats["numNodesExplored"], len(stats["pathToSolution"]), stats["nodesPerSecond"], stats["bound"], "" if stats["suboptimality"] == None else stats["suboptimality"], stats["status"], "yes" if stats.get("cached", False) else "no", ""]
+      if newMetrics != None:
+        row += ["" if stats["metrics"][name] == None else stats["metrics"][name] for name in SearchMetrics.SUMMARY]
+      writer.writerow(row)
       yield 
       count += 1
       file.flush()
       fStats.flush()
       
     # Write total stats to file
+    sizeName = str(sizes.pop()) if len(sizes) == 1 else "mixed size"
+    divisor = max(numSolved, 1) # avoid dividing by zero when every puzzle was invalid
     file.write("\n" + "="*150 + "\n")  
-    file.write(" Average Stats for {} {}-Puzzles: \n".format(len(puzzles), str(puzzles[0].boardLength-1)))
-    file.write("\t{:<38} ---> {:.2f}s \n".format("Average Time taken to complete puzzle:",totalStats["timeTaken"]/len(puzzles)))
-    file.write("\t{:<38} ---> {} \n".format("Average Number of expanded nodes:",str(totalStats["numNodesExplored"]/len(puzzles))))
-    file.write("\t{:<38} ---> {} \n".format("Average Number of steps to solution:",str(totalStats["numStepsToSolution"]/len(puzzles))))
-    file.write("\t{:<38} ---> {:.2f} nodes/s \n".format("Average Nodes expanded per second:",totalStats["nodesPerSecond"]/len(puzzles)))
+    file.write(" Average Stats for {} {}-Puzzles: \n".format(numSolved, sizeName))
+    file.write("\t{:<38} ---> {:.2f}s \n".format("Average Time taken to complete puzzle:",totalStats["timeTaken"]/divisor))
+    file.write("\t{:<38} ---> {} \n".format("Average Number of expanded nodes:",str(totalStats["numNodesExplored"]/divisor)))
+    file.write("\t{:<38} ---> {} \n".format("Average Number of steps to solution:",str(totalStats["numStepsToSolution"]/divisor)))
+    file.write("\t{:<38} ---> {:.2f} nodes/s \n".format("Average Nodes expanded per second:",totalStats["nodesPerSecond"]/divisor))
+    if numTimedOut > 0:
+      file.write("\t{:<38} ---> {} \n".format("Puzzles out of budget without solution:",numTimedOut))
+    if numCached > 0:
+      file.write("\t{:<38} ---> {} (not in the averages) \n".format("Puzzles served from cache:",numCached))
     file.write("="*150 + "\n")  
 
     file.close()
     fStats.close()
     # print average stats
     print("="*150)  
-    print(" Average Stats for {} {}-Puzzles:".format(len(puzzles), str(puzzles[0].boardLength-1)))
-    print("\t{:<38} ---> {:.2f}s".format("Average Time taken to complete puzzle:",totalStats["timeTaken"]/len(puzzles)))
-    print("\t{:<38} ---> {}".format("Average Number of expanded nodes:",str(totalStats["numNodesExplored"]/len(puzzles))))
-    print("\t{:<38} ---> {}".format("Average Number of steps to solution:",str(totalStats["numStepsToSolution"]/len(puzzles))))
-    print("\t{:<38} ---> {:.2f} nodes/s".format("Average Nodes expanded per second:",totalStats["nodesPerSecond"]/len(puzzles)))
+    print(" Average Stats for {} {}-Puzzles:".format(numSolved, sizeName))
+    print("\t{:<38} ---> {:.2f}s".format("Average Time taken to complete puzzle:",totalStats["timeTaken"]/divisor))
+    print("\t{:<38} ---> {}".format("Average Number of expanded nodes:",str(totalStats["numNodesExplored"]/divisor)))
+    print("\t{:<38} ---> {}".format("Average Number of steps to solution:",str(totalStats["numStepsToSolution"]/divisor)))
+    print("\t{:<38} ---> {:.2f} nodes/s".format("Average Nodes expanded per second:",totalStats["nodesPerSecond"]/divisor))
+    if numTimedOut > 0:
+      print("\t{:<38} ---> {}".format("Puzzles out of budget without solution:",numTimedOut))
+    if numCached > 0:
+      print("\t{:<38} ---> {} (not in the averages)".format("Puzzles served from cache:",numCached))
     print("="*150)  
     
     return
     
-  def solvePuzzle(s, debug=False):
+  def _solveAll(puzzles, solver, debug, workers, newMetrics=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzles, in a pool of worker processes if
+      workers > 1. At most 2 puzzles per worker are queued at a time so
+      puzzles are pulled from the iterable as they are needed.
+    Use: for puzzle, stats in Puzzle._solveAll(puzzles, solver, False, 4):
+    ----------------------------------------------------------
+    Parameters:
+      newMetrics - Called with each puzzle's ID to get the SearchMetrics to
+        solve it with, None to solve without metrics.
+    Yields:
+      puzzle, stats - Each puzzle and its stats, in the order of puzzles.
+    ----------------------------------------------------------
+    """
+    def solveArgs(count):
+      return {"metrics": newMetrics(count)} if newMetrics != None else {}
+    
+    if workers <= 1:
+      for count, puzzle in enumerate(puzzles, 1):
+        yield puzzle, (solver(puzzle, debug, **solveArgs(count)) if not isinstance(puzzle, InvalidPuzzle) else None)
+      return
+    
+    pool = multiprocessing.Pool(workers, initializer=PatternDatabase._useAll, initargs=(PatternDatabase._openPaths(),))
+    try:
+      pending = deque()
+      for count, puzzle in enumerate(puzzles, 1):
+        pending.append((puzzle, pool.apply_async(solver, (puzzle, debug), solveArgs(count)) if not isinstance(puzzle, InvalidPuzzle) else None))
+        if len(pending) >= workers * 2:
+          puzzle, result = pending.popleft()
+          yield puzzle, (result.get() if result != None else None)
+      while len(pending) != 0:
+        puzzle, result = pending.popleft()
+        yield puzzle, (result.get() if result != None else None)
+      pool.close()
+    finally:
+      pool.terminate()
+      pool.join()
+  
+  TIEBREAKS = {"h": (1, 0), "g": (0, 1), "none": (0, 0)}
+  
+  PARENT_BITS = 6 # bits of an explored entry holding the parent's blank index + 1, enough for the 35-puzzle
+
+  def _tracePath(explored, key, blank, bits):
+    """
+    ----------------------------------------------------------
+    Description: Rebuilds the path to the given state by following the parent
+      pointers in the explored table back to the starting state.
+    Use: path = Puzzle._tracePath(explored, key, blank, bits)
+    ----------------------------------------------------------
+    Parameters:
+      explored - The explored table filled in by the search.
+      key - The packed board to trace back from.
+      blank - The index of the blank in key.
+      bits - The number of bits per tile in key.
+    Returns:
+      path - The tiles moved to get from the starting state to key.
+    ----------------------------------------------------------
+    """
+    mask = (1 << bits) - 1
+    parentMask = (1 << Puzzle.PARENT_BITS) - 1
+    path = []
+    parentBlank = (explored[key] & parentMask) - 1
+    while parentBlank != -1:
+      tile = (key >> (bits * parentBlank)) & mask # the tile now sits where the parent's blank was
+      key = key - (tile << (bits * parentBlank)) + (tile << (bits * blank)) # slide it back
+      path.append(tile)
+      blank = parentBlank
+      parentBlank = (explored[key] & parentMask) - 1
+    path.reverse()
+    return path
+  
+  def solvePuzzle(s, debug=False, queue="auto", tiebreak="h", metrics=None, cache=None):
     """
     ----------------------------------------------------------
     Description: Solves the given puzzle using A*.
@@ -260,61 +1280,955 @@ class Puzzle:
     Parameters:
       s - Starting state to solve the puzzle from.
       debug - Whether or not to print debug information.
+      queue - The open list, "bucket" (BucketQueue), "heap" (HeapQueue) or
+        "auto" to use buckets whenever the heuristic is integer valued.
+      tiebreak - Which of the nodes with the lowest f to expand first, "h"
+        lowest h (deepest), "g" lowest g (shallowest) or "none" the most
+        recently generated.
+      metrics - A SearchMetrics to record the search in, None to not record
+        it. Debug records it without writing a samples file.
+      cache - A SolutionCache to look the puzzle up in before searching and
+        store the solution in after, None to always search.
     Returns:
       stats - Dictionary containing the following information:
         timeTaken         - The time taken to solve the puzzle.
         numNodesExplored  - The number of nodes explored.
         pathToSolution    - The path to the solution.
         nodesPerSecond    - The number of nodes expanded per second.
+        metrics           - The SearchMetrics summary, only if recorded.
+        cached            - True if the solution came from the cache.
     ----------------------------------------------------------
     """
     explored = {}
-    frontier = []
     startingBoard = s
+    width = int(s.width)
+    bits = State.bitsPerTile(s.boardLength)
+    mask = (1 << bits) - 1
+    neighbours = State.neighbourTable(width)
+    heuristic = s.heuristicFunction
+    delta = Heuristics.getDelta(heuristic, width)
+    goalKey = State.goalKey(s.boardLength)
+    if queue == "auto":
+      queue = "bucket" if Heuristics.isIntegral(heuristic) else "heap"
+    if queue == "bucket" and not Heuristics.isIntegral(heuristic):
+      raise ValueError("The bucket queue needs an integer valued heuristic, not " + Heuristics.heuristicToStr(heuristic))
+    frontier = BucketQueue() if queue == "bucket" else HeapQueue()
+    hWeight, gWeight = Puzzle.TIEBREAKS[tiebreak] # tie = h * hWeight + g * gWeight
     start = time.time()
-    heapq.heapify(frontier) # create heap and add initial state
-    heapq.heappush(frontier, s._getStateAsStr())
+    # frontier entries are (g, h, packed board, blank index, parent's blank index)
+    frontier.push(s.f, s.h * hWeight + s.g * gWeight, (s.g, s.h, s.toKey(), s.board.index(0), -1))
 
     if debug: print('start:\t', str(s))
+    if debug and metrics == None:
+      metrics = SearchMetrics(interval=100000, echo=True)
+    if metrics != None:
+      metrics.begin()
+    optimal = Heuristics.isAdmissible(heuristic)
+    stats = Puzzle._fromCache(s, cache, optimal, start, debug, metrics)
+    if stats != None:
+      return stats
     while len(frontier) != 0: # loop until frontier is empty
-      sParams = heapq.heappop(frontier) # (newState.f, newState.board, newState.g, newState.h, newState.path, newState.heuristicFunction)
-      # print('params:\t', sParams)
-      s = State.strToState(sParams[2])
-      exploredCost = explored.get(str(s))
+      g, h, key, blank, parentBlank = frontier.pop()
+      exploredCost = explored.get(key)
       if exploredCost != None:
-        if exploredCost <= s.g: # if the explored cost is less than the current cost, then we don't need to explore this state
+        if exploredCost >> Puzzle.PARENT_BITS <= g: # if the explored cost is less than the current cost, then we don't need to explore this state
+          if metrics != None: metrics.skipped(exploredCost >> Puzzle.PARENT_BITS, g)
           continue
-      explored[str(s)] = s.g
+        if metrics != None: metrics.reopened += 1
+      explored[key] = (g << Puzzle.PARENT_BITS) | (parentBlank + 1) # g and the parent pointer packed into one int
       
-      if s.h == 0: # check if at the goal state
+      if key == goalKey: # check if at the goal state
         break
       
-      if debug:
-        if len(explored) % 100000 == 0:
-          print(mem_top())
-          print('#explored:\t', len(explored))
-          print('nps:\t\t {:.2f}\n'.format(len(explored) / (time.time() - start)))
-        
-      for move in s.getMoves(): # add all possible moves to the frontier
-        heapq.heappush(frontier, move)
+      if metrics == None:
+        for index in neighbours[blank]: # add all possible moves to the frontier
+          shift = bits * index
+          tile = (key >> shift) & mask
+          childKey = key + (tile << (bits * blank)) - (tile << shift) # slide the tile into the blank
+          if delta != None:
+            childH = delta(key, childKey, h, tile, index, blank)
+          else:
+            childH = State(State.keyToBoard(childKey, s.boardLength, bits), width, heuristic=heuristic).h
+          frontier.push(g + 1 + childH, childH * hWeight + (g + 1) * gWeight, (g + 1, childH, childKey, index, blank))
+      else: # same expansion split into phases so each can be timed
+        moveStart = time.perf_counter()
+        metrics.queueTime += moveStart - metrics.mark # the pops and explored lookups since the last expansion
+        children = []
+        for index in neighbours[blank]:
+          shift = bits * index
+          tile = (key >> shift) & mask
+          children.append((index, tile, key + (tile << (bits * blank)) - (tile << shift)))
+        heuristicStart = time.perf_counter()
+        if delta != None:
+          childHs = [delta(key, childKey, h, tile, index, blank) for index, tile, childKey in children]
+        else:
+          childHs = [State(State.keyToBoard(childKey, s.boardLength, bits), width, heuristic=heuristic).h for index, tile, childKey in children]
+        queueStart = time.perf_counter()
+        for (index, tile, childKey), childH in zip(children, childHs):
+          frontier.push(g + 1 + childH, childH * hWeight + (g + 1) * gWeight, (g + 1, childH, childKey, index, blank))
+        metrics.mark = time.perf_counter()
+        metrics.moveTime += heuristicStart - moveStart
+        metrics.heuristicTime += queueStart - heuristicStart
+        metrics.queueTime += metrics.mark - queueStart
+        metrics.expand(g + h, len(frontier), len(explored))
 
     # pass the solution and stats back to the caller
+    stats = Puzzle._buildStats(startingBoard, start, len(explored), startingBoard.path + Puzzle._tracePath(explored, key, blank, bits), debug)
+    if metrics != None:
+      stats["metrics"] = metrics.finish(g + h, len(frontier), len(explored))
+    if key == goalKey:
+      Puzzle._toCache(s, cache, optimal, stats)
+    return stats
+  
+  def solvePuzzleAnytime(s, debug=False, weight=1, maxNodes=None, timeLimit=None, metrics=None, cache=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzle using anytime weighted A*. Nodes are
+      expanded by g + weight * h, which finds a first solution quickly, and
+      the search carries on to improve it, pruning nodes whose g + h cannot
+      beat it, until nothing is left (the solution is optimal) or the budget
+      runs out. The lowest g + h left in the open list is a lower bound on
+      the optimal solution length.
+    Use: stats = Puzzle.solvePuzzleAnytime(puzzle, weight=2, timeLimit=10)
+    ----------------------------------------------------------
+    Parameters:
+      s - Starting state to solve the puzzle from.
+      debug - Whether or not to print debug information.
+      weight - How much more h counts than g, 1 is A* with a budget.
+      maxNodes - The most nodes to explore, None for no limit.
+      timeLimit - The most seconds to search for, None for no limit.
+      metrics - See Puzzle.solvePuzzle, nothing is timed.
+      cache - See Puzzle.solvePuzzle, only proven optimal solutions are
+        served and stored.
+    Returns:
+      stats - Same as Puzzle.solvePuzzle, with:
+        status            - "optimal" if the solution is proven optimal,
+          "suboptimal" if the budget ran out after a solution was found, or
+          "timeout" if it ran out before, in which case pathToSolution leads
+          to the explored state with the lowest h.
+        bound             - The lower bound on the optimal solution length.
+        suboptimality     - The most the solution can be longer than optimal
+          by, as a factor, None on timeout.
+    ----------------------------------------------------------
+    """
+    explored = {}
+    width = int(s.width)
+    bits = State.bitsPerTile(s.boardLength)
+    mask = (1 << bits) - 1
+    neighbours = State.neighbourTable(width)
+    heuristic = s.heuristicFunction
+    delta = Heuristics.getDelta(heuristic, width)
+    goalKey = State.goalKey(s.boardLength)
+    if float(weight).is_integer():
+      weight = int(weight)
+    frontier = BucketQueue() if Heuristics.isIntegral(heuristic) and isinstance(weight, int) else HeapQueue()
+    fCounts = {} # g + h -> the number of open entries with it
+    fHeap = [] # the g + h values in fCounts, lazily removed once their count is 0
+    start = time.time()
+    
+    if debug: print('start:\t', str(s))
+    if metrics != None:
+      metrics.begin()
+      metrics.heuristicTime = metrics.moveTime = metrics.queueTime = None # not timed
+    stats = Puzzle._fromCache(s, cache, True, start, debug, metrics)
+    if stats != None:
+      return stats
+    
+    def pushF(f):
+      if fCounts.get(f, 0) == 0:
+        heapq.heappush(fHeap, f)
+      fCounts[f] = fCounts.get(f, 0) + 1
+    
+    startKey = s.toKey()
+    frontier.push(s.g + weight * s.h, s.h, (s.g, s.h, startKey, s.board.index(0), -1))
+    pushF(s.g + s.h)
+    incumbent = math.inf # length of the best solution found
+    closest = (s.h, startKey, s.board.index(0)) # the explored state with the lowest h, for when no solution is found
+    status = "optimal"
+    while len(frontier) != 0:
+      if maxNodes != None and len(explored) >= maxNodes:
+        status = "suboptimal"
+        break
+      if timeLimit != None and len(explored) % 1024 == 0 and time.time() - start > timeLimit:
+        status = "suboptimal"
+        break
+      g, h, key, blank, parentBlank = frontier.pop()
+      fCounts[g + h] -= 1
+      if g + h >= incumbent: # cannot lead to a shorter solution
+        continue
+      exploredCost = explored.get(key)
+      if exploredCost != None and exploredCost >> Puzzle.PARENT_BITS <= g:
+        if metrics != None: metrics.skipped(exploredCost >> Puzzle.PARENT_BITS, g)
+        continue
+      explored[key] = (g << Puzzle.PARENT_BITS) | (parentBlank + 1)
+      if key == goalKey:
+        incumbent = g
+        if debug: print('solution:\t {}\t#explored:\t {}'.format(g, len(explored)))
+        continue
+      if h < closest[0]:
+        closest = (h, key, blank)
+      if metrics != None: metrics.expand(g + h, len(frontier), len(explored))
+      
+      for index in neighbours[blank]:
+        shift = bits * index
+        tile = (key >> shift) & mask
+        childKey = key + (tile << (bits * blank)) - (tile << shift)
+        if delta != None:
+          childH = delta(key, childKey, h, tile, index, blank)
+        else:
+          childH = State(State.keyToBoard(childKey, s.boardLength, bits), width, heuristic=heuristic).h
+        if g + 1 + childH < incumbent:
+          frontier.push(g + 1 + weight * childH, childH, (g + 1, childH, childKey, index, blank))
+          pushF(g + 1 + childH)
+    
+    while len(fHeap) != 0 and fCounts[fHeap[0]] == 0:
+      heapq.heappop(fHeap)
+    bound = min(incumbent, fHeap[0]) if len(fHeap) != 0 else incumbent
+    if incumbent != math.inf and bound >= incumbent: # nothing left could beat the solution, even if the budget ran out first
+      status = "optimal"
+    if status == "optimal" and not Heuristics.isAdmissible(heuristic): # the bound only holds if h never overestimates
+      status = "suboptimal"
+    if incumbent != math.inf:
+      path = Puzzle._tracePath(explored, goalKey, 0, bits)
+    else:
+      status = "timeout"
+      path = Puzzle._tracePath(explored, closest[1], closest[2], bits) if len(explored) != 0 else []
+    stats = Puzzle._buildStats(s, start, len(explored), s.path + path, debug)
+    stats["status"] = status
+    stats["bound"] = bound
+    if status == "timeout":
+      stats["suboptimality"] = None
+    else:
+      stats["suboptimality"] = len(path) / bound if bound > 0 else 1.0
+    if debug: print("\t{:<30} ---> {} (bound {}, suboptimality {})".format("Status:", status, bound, stats["suboptimality"]))
+    if metrics != None:
+      stats["metrics"] = metrics.finish(bound, len(frontier), len(explored))
+    if status == "optimal" and incumbent != math.inf:
+      Puzzle._toCache(s, cache, Heuristics.isAdmissible(heuristic), stats)
+    return stats
+  
+  def solvePuzzleExternal(s, debug=False, memoryLimit=1024, directory=None, metrics=None, cache=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzle using external memory A*, for
+      searches that do not fit in RAM. Nodes are kept in buckets by (g, h),
+      expanded lowest f first, then lowest g. Children are buffered in RAM
+      and spilled to disk as sorted runs once the buffers reach what
+      memoryLimit allows. A bucket's runs are merged with sequential reads
+      just before it is expanded, dropping duplicates within the bucket and
+      states already expanded in bucket (g - 2, h), which is the only other
+      place a duplicate can be since every move flips the parity of g and a
+      state's h never changes. Expanded buckets are kept as sorted files of
+      fixed-size records, which the path is traced back through by binary
+      search. Needs an integer valued consistent heuristic.
+    Use: stats = Puzzle.solvePuzzleExternal(puzzle, memoryLimit=512)
+    ----------------------------------------------------------
+    Parameters:
+      s - Starting state to solve the puzzle from.
+      debug - Whether or not to print debug information.
+      memoryLimit - The peak RSS to stay under, in MiB.
+      directory - Where to make the temporary directory for the buckets,
+        None for the system default. It is removed afterwards.
+      metrics - See Puzzle.solvePuzzleIDA, the frontier is the number of
+        buffered records.
+      cache - See Puzzle.solvePuzzle.
+    Returns:
+      stats - Same as Puzzle.solvePuzzle.
+    ----------------------------------------------------------
+    """
+    width = int(s.width)
+    n = s.boardLength
+    bits = State.bitsPerTile(n)
+    mask = (1 << bits) - 1
+    parentMask = (1 << Puzzle.PARENT_BITS) - 1
+    neighbours = State.neighbourTable(width)
+    heuristic = s.heuristicFunction
+    delta = Heuristics.getDelta(heuristic, width)
+    goalKey = State.goalKey(n)
+    if not Heuristics.isIntegral(heuristic) or not Heuristics.isConsistent(heuristic) or delta == None:
+      raise ValueError("External memory search needs an integer valued consistent heuristic, not " + Heuristics.heuristicToStr(heuristic))
+    # a record is the packed board, its blank index and its parent's blank index + 1, sorted by board
+    recordBits = 2 * Puzzle.PARENT_BITS
+    recordSize = (bits * n + recordBits + 7) // 8
+    perRecord = sys.getsizeof(((1 << (bits * n)) - 1) << recordBits) + 16 # the int, its list slot and room to sort the list
+    budget = memoryLimit * 1024 * 1024 - (SearchMetrics.currentRSS() or 0) - Puzzle.EXTERNAL_RESERVE
+    if budget <= 0:
+      raise ValueError("memoryLimit of {} MiB leaves no room for the buffers".format(memoryLimit))
+    maxBuffered = budget // perRecord
+    
+    start = time.time()
+    if debug: print('start:\t', str(s))
+    if metrics != None:
+      metrics.begin()
+      metrics.heuristicTime = metrics.moveTime = metrics.queueTime = None # not timed
+    optimal = Heuristics.isAdmissible(heuristic)
+    stats = Puzzle._fromCache(s, cache, optimal, start, debug, metrics)
+    if stats != None:
+      return stats
+    
+    workDir = tempfile.mkdtemp(prefix="npuzzle-", dir=directory)
+    buffers = {} # (g, h) -> records not written yet
+    runs = {} # (g, h) -> sorted run files not merged yet
+    expanded = {} # (g, h) -> (file, number of records) of the buckets already expanded
+    buffered = 0
+    numRuns = 0
+    
+    def writeRecords(path, records):
+      with open(path, "wb") as file:
+        for i in range(0, len(records), 4096):
+          file.write(b"".join(record.to_bytes(recordSize, "big") for record in records[i:i + 4096]))
+    
+    def readRecords(path):
+      with open(path, "rb", buffering=0) as file:
+        while True:
+          chunk = file.read(recordSize * 4096)
+          if len(chunk) == 0:
+            return
+          for i in range(0, len(chunk), recordSize):
+            yield int.from_bytes(chunk[i:i + recordSize], "big")
+    
+    def spill(): # write every buffer out as a sorted run
+      nonlocal buffered, numRuns
+      for bucket, records in buffers.items():
+        records.sort()
+        numRuns += 1
+        path = os.path.join(workDir, "run{}".format(numRuns))
+        writeRecords(path, records)
+        runs.setdefault(bucket, []).append(path)
+      buffers.clear()
+      buffered = 0
+    
+    def mergeRuns(paths): # merge runs into one to keep the number of open files down
+      nonlocal numRuns
+      numRuns += 1
+      path = os.path.join(workDir, "run{}".format(numRuns))
+      with open(path, "wb") as file:
+        chunk = []
+        for record in heapq.merge(*[readRecords(run) for run in paths]):
+          chunk.append(record.to_bytes(recordSize, "big"))
+          if len(chunk) == 4096:
+            file.write(b"".join(chunk))
+            chunk = []
+        file.write(b"".join(chunk))
+      for run in paths:
+        os.remove(run)
+      return path
+    
+    def findRecord(bucket, key): # binary search an expanded bucket for key
+      path, count = expanded[bucket]
+      with open(path, "rb") as file:
+        low, high = 0, count - 1
+        while low <= high:
+          middle = (low + high) // 2
+          file.seek(middle * recordSize)
+          record = int.from_bytes(file.read(recordSize), "big")
+          if record >> recordBits == key:
+            return record
+          if record >> recordBits < key:
+            low = middle + 1
+          else:
+            high = middle - 1
+    
+    try:
+      buffers[(s.g, s.h)] = [(((s.toKey() << Puzzle.PARENT_BITS) | s.board.index(0)) << Puzzle.PARENT_BITS)] # no parent
+      buffered = 1
+      numNodes = 0
+      goal = None
+      while goal == None and len(buffers) + len(runs) != 0:
+        g, h = min(set(buffers) | set(runs), key=lambda bucket: (bucket[0] + bucket[1], bucket[0]))
+        paths = runs.pop((g, h), [])
+        while len(paths) > Puzzle.EXTERNAL_FAN_IN:
+          paths = [mergeRuns(paths[i:i + Puzzle.EXTERNAL_FAN_IN]) for i in range(0, len(paths), Puzzle.EXTERNAL_FAN_IN)]
+        sources = [readRecords(path) for path in paths]
+        if (g, h) in buffers:
+          records = buffers.pop((g, h))
+          buffered -= len(records)
+          records.sort()
+          sources.append(iter(records))
+        older = readRecords(expanded[(g - 2, h)][0]) if (g - 2, h) in expanded else iter(())
+        olderKey = -1
+        
+        path = os.path.join(workDir, "bucket{}-{}".format(g, h))
+        file = open(path, "wb")
+        chunk = []
+        count = 0
+        lastKey = -1
+        for record in heapq.merge(*sources):
+          key = record >> recordBits
+          if key == lastKey: # duplicate within the bucket
+            continue
+          lastKey = key
+          while olderKey < key:
+            olderKey = next(older, 1 << (bits * n + recordBits)) >> recordBits # past every key once exhausted
+          if olderKey == key: # already expanded more cheaply
+            continue
+          chunk.append(record.to_bytes(recordSize, "big"))
+          count += 1
+          if len(chunk) == 4096:
+            file.write(b"".join(chunk))
+            chunk = []
+          if key == goalKey:
+            goal = record
+            break
+          
+          numNodes += 1
+          blank = (record >> Puzzle.PARENT_BITS) & parentMask
+          parentBlank = (record & parentMask) - 1
+          if metrics != None: metrics.expand(g + h, buffered, numNodes)
+          for index in neighbours[blank]:
+            if index == parentBlank: # moving the tile back would undo the last move
+              continue
+            shift = bits * index
+            tile = (key >> shift) & mask
+            childKey = key + (tile << (bits * blank)) - (tile << shift)
+            childH = delta(key, childKey, h, tile, index, blank)
+            child = (((childKey << Puzzle.PARENT_BITS) | index) << Puzzle.PARENT_BITS) | (blank + 1)
+            buffers.setdefault((g + 1, childH), []).append(child)
+            buffered += 1
+          if buffered >= maxBuffered:
+            spill()
+        file.write(b"".join(chunk))
+        file.close()
+        for run in paths:
+          os.remove(run)
+        expanded[(g, h)] = (path, count)
+        if debug and count != 0: print('bucket:\t g {} h {}\t#states:\t {}\t#expanded:\t {}'.format(g, h, count, numNodes))
+      
+      # follow the parent pointers back through the expanded buckets
+      path = []
+      if goal != None:
+        key, record = goalKey, goal
+        while record & parentMask != 0:
+          blank = (record >> Puzzle.PARENT_BITS) & parentMask
+          parentBlank = (record & parentMask) - 1
+          tile = (key >> (bits * parentBlank)) & mask
+          parentKey = key - (tile << (bits * parentBlank)) + (tile << (bits * blank))
+          h = delta(key, parentKey, h, tile, parentBlank, blank)
+          g -= 1
+          key, record = parentKey, findRecord((g, h), parentKey)
+          path.append(tile)
+        path.reverse()
+    finally:
+      shutil.rmtree(workDir, ignore_errors=True)
+    
+    if debug: print('peak RSS:\t {:.1f} MiB of {} MiB\t#runs:\t {}'.format((SearchMetrics.peakRSS() or 0) / 1024 / 1024, memoryLimit, numRuns))
+    stats = Puzzle._buildStats(s, start, numNodes, s.path + path, debug)
+    if metrics != None:
+      stats["metrics"] = metrics.finish(g + h, buffered, numNodes)
+    if goal != None:
+      Puzzle._toCache(s, cache, optimal, stats)
+    return stats
+  
+  EXTERNAL_RESERVE = 8 * 1024 * 1024 # bytes of memoryLimit kept for everything but the buffers
+  
+  EXTERNAL_FAN_IN = 64 # the most runs merged at once
+  
+  def solvePuzzleIDA(s, debug=False, metrics=None, cache=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzle using IDA*. Memory use is linear
+      in the depth of the solution.
+    Use: stats = Puzzle.solvePuzzleIDA(puzzle)
+    ----------------------------------------------------------
+    Parameters:
+      s - Starting state to solve the puzzle from.
+      debug - Whether or not to print debug information.
+      metrics - A SearchMetrics to record the search in, None to not record
+        it. The layers are the bounds, the frontier is the search depth and
+        nothing is timed.
+      cache - See Puzzle.solvePuzzle.
+    Returns:
+      stats - Same as Puzzle.solvePuzzle, numNodesExplored counts the
+        expansions of every iteration.
+    ----------------------------------------------------------
+    """
+    width = int(s.width)
+    bits = State.bitsPerTile(s.boardLength)
+    neighbours = State.neighbourTable(width)
+    heuristic = s.heuristicFunction
+    delta = Heuristics.getDelta(heuristic, width)
+    goalKey = State.goalKey(s.boardLength)
+    board = s.board[:] # mutated in place and restored on backtrack
+    path = []
+    numNodes = 0
+    
+    # depth first search below bound, returns -1 if the goal was found, otherwise the smallest f that was pruned
+    def search(g, h, key, blank, parentBlank):
+      nonlocal numNodes
+      f = g + h
+      if f > bound:
+        return f
+      if key == goalKey:
+        return -1
+      numNodes += 1
+      if metrics != None: metrics.expand(bound, len(path), 0)
+      minimum = math.inf
+      for index in neighbours[blank]:
+        if index == parentBlank: # moving the tile back would undo the last move
+          continue
+        tile = board[index]
+        childKey = key + (tile << (bits * blank)) - (tile << (bits * index))
+        board[blank], board[index] = tile, 0
+        if delta != None:
+          childH = delta(key, childKey, h, tile, index, blank)
+        else:
+          childH = State(board, width, heuristic=heuristic).h
+        path.append(tile)
+        t = search(g + 1, childH, childKey, index, blank)
+        if t == -1:
+          return -1
+        path.pop() # undo the move
+        board[blank], board[index] = 0, tile
+        if t < minimum:
+          minimum = t
+      return minimum
+    
+    start = time.time()
+    if debug: print('start:\t', str(s))
+    if metrics != None:
+      metrics.begin()
+      metrics.heuristicTime = metrics.moveTime = metrics.queueTime = None # not timed
+    optimal = Heuristics.isAdmissible(heuristic)
+    stats = Puzzle._fromCache(s, cache, optimal, start, debug, metrics)
+    if stats != None:
+      return stats
+    bound = s.h
+    while True:
+      t = search(s.g, s.h, s.toKey(), s.board.index(0), -1)
+      if t == -1 or t == math.inf: # solved, or nothing left below any bound
+        break
+      if debug: print('bound:\t {} -> {}\t#explored:\t {}'.format(bound, t, numNodes))
+      bound = t
+    
+    stats = Puzzle._buildStats(s, start, numNodes, s.path + path, debug)
+    if metrics != None:
+      stats["metrics"] = metrics.finish(bound, len(path), 0)
+    if t == -1:
+      Puzzle._toCache(s, cache, optimal, stats)
+    return stats
+  
+  def solvePuzzleBidirectional(s, debug=False, metrics=None, cache=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzle using MM, a bidirectional A* that
+      searches forward from the start and backward from the goal and meets
+      in the middle. Each direction expands nodes by max(f, 2g), so neither
+      searches past half the solution depth, and the search stops once the
+      cheapest path found through a node seen from both sides costs no more
+      than the lowest priority left, which makes it optimal.
+    Use: stats = Puzzle.solvePuzzleBidirectional(puzzle)
+    ----------------------------------------------------------
+    Parameters:
+      s - Starting state to solve the puzzle from.
+      debug - Whether or not to print debug information.
+      metrics - See Puzzle.solvePuzzleIDA, the layers are the priorities.
+      cache - See Puzzle.solvePuzzle.
+    Returns:
+      stats - Same as Puzzle.solvePuzzle, numNodesExplored counts the
+        expansions of both directions.
+    ----------------------------------------------------------
+    """
+    width = int(s.width)
+    bits = State.bitsPerTile(s.boardLength)
+    mask = (1 << bits) - 1
+    neighbours = State.neighbourTable(width)
+    heuristic = s.heuristicFunction
+    # the backward search estimates the distance to the start, tile tables and linear conflicts can be rebuilt for any
+    # goal but pattern databases cannot, so they fall back to linear conflicts going backward
+    backwardHeuristic = heuristic if heuristic != Heuristics.PATTERNDB else Heuristics.LINEARCONFLICT
+    starts = [s.board.index(tile) for tile in range(s.boardLength)]
+    deltas = [Heuristics.getDelta(heuristic, width), Heuristics.getDelta(backwardHeuristic, width, starts)]
+    if deltas[0] == None or deltas[1] == None:
+      raise ValueError("Bidirectional search needs a heuristic with an incremental form, not " + Heuristics.heuristicToStr(heuristic))
+    opens = [BucketQueue(), BucketQueue()] if Heuristics.isIntegral(heuristic) else [HeapQueue(), HeapQueue()]
+    seen = [{}, {}] # the cheapest g generated in each direction and the parent pointer, packed as in the A* explored table
+    startKey = s.toKey()
+    roots = [
+      (startKey, s.board.index(0), s.h),
+      (State.goalKey(s.boardLength), 0, State(s.board, width, heuristic=backwardHeuristic).h) # the estimates are symmetric, so the goal's distance to the start is the start's to the goal
+    ]
+    
+    start = time.time()
+    if debug: print('start:\t', str(s))
+    if metrics != None:
+      metrics.begin()
+      metrics.heuristicTime = metrics.moveTime = metrics.queueTime = None # not timed
+    optimal = Heuristics.isAdmissible(heuristic)
+    stats = Puzzle._fromCache(s, cache, optimal, start, debug, metrics)
+    if stats != None:
+      return stats
+    
+    for direction in range(2):
+      key, blank, h = roots[direction]
+      seen[direction][key] = 0 # g 0, no parent
+      opens[direction].push(h, h, (0, h, key, blank, -1))
+    gCounts = [[1], [1]] # gCounts[direction][g] is the number of open entries with that g
+    gMins = [0, 0] # the lowest g in each open list, pushes are one deeper than a pop so it never goes down
+    best = 0 if roots[0][0] == roots[1][0] else math.inf # cost of the cheapest path found
+    meetKey, meetBlank = startKey, roots[0][1]
+    numNodes = 0
+    while len(opens[0]) != 0 and len(opens[1]) != 0:
+      forwardMin = opens[0].minimum()
+      backwardMin = opens[1].minimum()
+      for direction in range(2):
+        while gCounts[direction][gMins[direction]] == 0:
+          gMins[direction] += 1
+      # no path through the open nodes can be cheaper, paths through a node open in both are already in best and any
+      # other joins an open node from each side by at least one move
+      if best <= max(min(forwardMin, backwardMin), gMins[0] + gMins[1] + 1):
+        break
+      direction = 0 if forwardMin < backwardMin or (forwardMin == backwardMin and len(opens[0]) <= len(opens[1])) else 1
+      frontier, own, other, delta, counts = opens[direction], seen[direction], seen[1 - direction], deltas[direction], gCounts[direction]
+      g, h, key, blank, parentBlank = frontier.pop()
+      counts[g] -= 1
+      if own[key] >> Puzzle.PARENT_BITS < g: # reached more cheaply since this was pushed
+        if metrics != None: metrics.skipped(own[key] >> Puzzle.PARENT_BITS, g)
+        continue
+      numNodes += 1
+      if metrics != None: metrics.expand(max(g + h, 2 * g), len(opens[0]) + len(opens[1]), len(seen[0]) + len(seen[1]))
+      
+      for index in neighbours[blank]:
+        if index == parentBlank: # moving the tile back would undo the last move
+          continue
+        shift = bits * index
+        tile = (key >> shift) & mask
+        childKey = key + (tile << (bits * blank)) - (tile << shift)
+        childG = g + 1
+        entry = own.get(childKey)
+        if entry != None and entry >> Puzzle.PARENT_BITS <= childG:
+          continue
+        own[childKey] = (childG << Puzzle.PARENT_BITS) | (blank + 1)
+        entry = other.get(childKey)
+        if entry != None and childG + (entry >> Puzzle.PARENT_BITS) < best: # the frontiers meet here
+          best = childG + (entry >> Puzzle.PARENT_BITS)
+          meetKey, meetBlank = childKey, index
+        childH = delta(key, childKey, h, tile, index, blank)
+        frontier.push(max(childG + childH, 2 * childG), childH, (childG, childH, childKey, index, blank))
+        if len(counts) == childG:
+          counts.append(0)
+        counts[childG] += 1
+    
+    # the backward half was found from the goal, so its moves are undone in reverse to continue from the meeting state
+    path = Puzzle._tracePath(seen[0], meetKey, meetBlank, bits) + Puzzle._tracePath(seen[1], meetKey, meetBlank, bits)[::-1] if best != math.inf else []
+    stats = Puzzle._buildStats(s, start, numNodes, s.path + path, debug)
+    if metrics != None:
+      stats["metrics"] = metrics.finish(best, len(opens[0]) + len(opens[1]), len(seen[0]) + len(seen[1]))
+    if best != math.inf:
+      Puzzle._toCache(s, cache, optimal, stats)
+    return stats
+  
+  def solvePuzzleHDA(s, debug=False, workers=2, metrics=None, cache=None):
+    """
+    ----------------------------------------------------------
+    Description: Solves the given puzzle using HDA*, A* split across worker
+      processes. Every state is owned by one worker, picked by a hash of its
+      packed board, which keeps the open and explored entries for it, so
+      duplicates are found without sharing memory. Workers send the children
+      they do not own to their owners in batches, and prune nodes with f no
+      lower than the cheapest solution found so far, which is sent to every
+      worker. The search ends once every worker has nothing left to expand
+      and every batch sent has been received, checked by two waves of probes
+      that see the same counts, so the solution is optimal.
+    Use: stats = Puzzle.solvePuzzleHDA(puzzle, workers=4)
+    ----------------------------------------------------------
+    Parameters:
+      s - Starting state to solve the puzzle from.
+      debug - Whether or not to print debug information.
+      workers - The number of worker processes.
+      metrics - A SearchMetrics to put the totals in, nothing is sampled.
+      cache - See Puzzle.solvePuzzle.
+    Returns:
+      stats - Same as Puzzle.solvePuzzle, numNodesExplored is the size of
+        every worker's explored table.
+    ----------------------------------------------------------
+    """
+    bits = State.bitsPerTile(s.boardLength)
+    mask = (1 << bits) - 1
+    parentMask = (1 << Puzzle.PARENT_BITS) - 1
+    goalKey = State.goalKey(s.boardLength)
+    heuristic = s.heuristicFunction
+    start = time.time()
+    if debug: print('start:\t', str(s))
+    if metrics != None:
+      metrics.begin()
+      metrics.heuristicTime = metrics.moveTime = metrics.queueTime = None # not timed
+    optimal = Heuristics.isAdmissible(heuristic)
+    stats = Puzzle._fromCache(s, cache, optimal, start, debug, metrics)
+    if stats != None:
+      return stats
+    
+    inboxes = [multiprocessing.Queue() for i in range(workers)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=Puzzle._hdaWorker, args=(i, inboxes, results, Heuristics.heuristicToStr(heuristic), int(s.width), PatternDatabase._openPaths()), daemon=True) for i in range(workers)]
+    for process in processes:
+      process.start()
+    try:
+      def receive(kind): # take the next reply of the given kind, noting any cheaper solution on the way
+        nonlocal best
+        while True:
+          try:
+            message = results.get(timeout=Puzzle.HDA_POLL)
+          except Empty: # nothing yet, make sure every worker is still there to reply
+            for i, process in enumerate(processes):
+              if process.exitcode not in (None, 0): # workers only exit cleanly once told to stop
+                raise RuntimeError("HDA* worker {} exited with code {}".format(i, process.exitcode))
+            continue
+          if message[0] == "incumbent":
+            best = min(best, message[1])
+          elif message[0] == kind:
+            return message
+      
+      best = math.inf
+      startKey = s.toKey()
+      inboxes[Puzzle._hdaOwner(startKey, workers)].put(("nodes", [(s.g, s.h, startKey, s.board.index(0), -1)]))
+      previous = None
+      wave = 0
+      while True: # probe until two waves in a row find every worker idle with the same balanced counts
+        wave += 1
+        for inbox in inboxes:
+          inbox.put(("probe", wave))
+        replies = {}
+        while len(replies) < workers:
+          message = receive("probe")
+          if message[1] == wave:
+            replies[message[2]] = message[3:]
+        counts = [replies[i] for i in range(workers)]
+        sent = sum(count[1] for count in counts) + 1 # + the batch holding the starting state
+        received = sum(count[2] for count in counts)
+        if all(count[0] for count in counts) and sent == received and counts == previous:
+          break
+        previous = counts
+      
+      # follow the parent pointers back from the goal, asking the owner of each state
+      path = []
+      key = goalKey
+      blank = 0
+      while best != math.inf:
+        inboxes[Puzzle._hdaOwner(key, workers)].put(("lookup", key))
+        parentBlank = (receive("lookup")[1] & parentMask) - 1
+        if parentBlank == -1:
+          break
+        tile = (key >> (bits * parentBlank)) & mask
+        key = key - (tile << (bits * parentBlank)) + (tile << (bits * blank))
+        path.append(tile)
+        blank = parentBlank
+      path.reverse()
+      
+      for inbox in inboxes:
+        inbox.put(("stop",))
+      numNodes = 0
+      for i in range(workers):
+        message = receive("stopped")
+        numNodes += message[2]
+        if debug: print('worker {}:\t #explored:\t {}'.format(message[1], message[2]))
+    except BaseException:
+      for process in processes: # the rest would wait for the failed worker forever
+        process.terminate()
+      raise
+    finally:
+      for process in processes:
+        process.join(5)
+        if process.is_alive():
+          process.terminate()
+    
+    stats = Puzzle._buildStats(s, start, numNodes, s.path + path, debug)
+    if metrics != None:
+      metrics.expanded = numNodes
+      stats["metrics"] = metrics.finish(best, 0, numNodes)
+    if best != math.inf:
+      Puzzle._toCache(s, cache, optimal, stats)
+    return stats
+  
+  HDA_BATCH = 256 # children sent to another worker in one message
+  
+  HDA_CHECK = 256 # expansions between checks of a worker's inbox
+  
+  HDA_POLL = 1 # seconds the coordinator waits for a reply before checking the workers are alive
+  
+  def _hdaOwner(key, workers):
+    return ((key * 0x9E3779B97F4A7C15) >> 64) % workers # multiplicative hash, sibling boards differ in few bits
+  
+  def _hdaWorker(index, inboxes, results, heuristicName, width, pdbPaths):
+    """
+    ----------------------------------------------------------
+    Description: One worker of Puzzle.solvePuzzleHDA. Handles these messages
+      from its inbox until told to stop:
+        ("nodes", entries) - Frontier entries of states this worker owns.
+        ("incumbent", g) - The cost of a solution another worker found.
+        ("probe", wave) - Reply whether there is nothing left to expand and
+          the number of batches sent and received.
+        ("lookup", key) - Reply the explored entry of key.
+        ("stop",) - Reply the explored table size and exit.
+    Use: multiprocessing.Process(target=Puzzle._hdaWorker, args=(0, inboxes, results, "MANHATTAN", 4, []))
+    ----------------------------------------------------------
+    """
+    PatternDatabase._useAll(pdbPaths)
+    heuristic = Heuristics.strToHeuristic(heuristicName)
+    n = width * width
+    bits = State.bitsPerTile(n)
+    mask = (1 << bits) - 1
+    neighbours = State.neighbourTable(width)
+    delta = Heuristics.getDelta(heuristic, width)
+    goalKey = State.goalKey(n)
+    workers = len(inboxes)
+    frontier = BucketQueue() if Heuristics.isIntegral(heuristic) else HeapQueue()
+    explored = {}
+    outboxes = [[] for i in range(workers)]
+    best = math.inf
+    sent = 0
+    received = 0
+    
+    def send(owner):
+      nonlocal sent
+      inboxes[owner].put(("nodes", outboxes[owner]))
+      outboxes[owner] = []
+      sent += 1
+    
+    def handle(message): # returns False once told to stop
+      nonlocal best, received
+      if message[0] == "nodes":
+        received += 1
+        for entry in message[1]:
+          exploredCost = explored.get(entry[2])
+          if exploredCost == None or exploredCost >> Puzzle.PARENT_BITS > entry[0]:
+            frontier.push(entry[0] + entry[1], entry[1], entry)
+      elif message[0] == "incumbent":
+        best = min(best, message[1])
+      elif message[0] == "probe":
+        idle = frontier.minimum() >= best and not any(outboxes)
+        results.put(("probe", message[1], index, idle, sent, received))
+      elif message[0] == "lookup":
+        results.put(("lookup", explored[message[1]]))
+      elif message[0] == "stop":
+        results.put(("stopped", index, len(explored)))
+        return False
+      return True
+    
+    running = True
+    expansions = 0
+    while running:
+      if frontier.minimum() >= best: # nothing here can lead to a cheaper solution, pass on what is queued and wait
+        for owner in range(workers):
+          if len(outboxes[owner]) != 0:
+            send(owner)
+        running = handle(inboxes[index].get())
+        continue
+      
+      g, h, key, blank, parentBlank = frontier.pop()
+      exploredCost = explored.get(key)
+      if exploredCost != None and exploredCost >> Puzzle.PARENT_BITS <= g:
+        continue
+      explored[key] = (g << Puzzle.PARENT_BITS) | (parentBlank + 1)
+      if key == goalKey:
+        if g < best:
+          best = g
+          for owner in range(workers):
+            if owner != index:
+              inboxes[owner].put(("incumbent", g))
+          results.put(("incumbent", g))
+        continue
+      
+      for childIndex in neighbours[blank]:
+        shift = bits * childIndex
+        tile = (key >> shift) & mask
+        childKey = key + (tile << (bits * blank)) - (tile << shift)
+        if delta != None:
+          childH = delta(key, childKey, h, tile, childIndex, blank)
+        else:
+          childH = State(State.keyToBoard(childKey, n, bits), width, heuristic=heuristic).h
+        owner = Puzzle._hdaOwner(childKey, workers)
+        if owner == index:
+          frontier.push(g + 1 + childH, childH, (g + 1, childH, childKey, childIndex, blank))
+        else:
+          outboxes[owner].append((g + 1, childH, childKey, childIndex, blank))
+          if len(outboxes[owner]) >= Puzzle.HDA_BATCH:
+            send(owner)
+      
+      expansions += 1
+      if expansions % Puzzle.HDA_CHECK == 0: # keep the other workers fed and pick up what they sent
+        for owner in range(workers):
+          if len(outboxes[owner]) != 0:
+            send(owner)
+        while running:
+          try:
+            running = handle(inboxes[index].get_nowait())
+          except Empty:
+            break
+  
+  def _fromCache(s, cache, optimal, start, debug, metrics):
+    """
+    ----------------------------------------------------------
+    Description: Looks the puzzle up in the cache before searching.
+    Use: stats = Puzzle._fromCache(s, cache, True, start, debug, metrics)
+    ----------------------------------------------------------
+    Returns:
+      stats - The stats of the cached solution, or None if the puzzle has
+        to be searched.
+    ----------------------------------------------------------
+    """
+    if cache == None:
+      return None
+    path = cache.lookup(s.board, int(s.width), optimal)
+    if path == None:
+      return None
+    if debug: print('cached:\t', str(s))
+    stats = Puzzle._buildStats(s, start, 0, s.path + path, debug)
+    stats["cached"] = True
+    if metrics != None:
+      stats["metrics"] = metrics.finish(len(path), 0, 0)
+    return stats
+  
+  def _toCache(s, cache, optimal, stats):
+    if cache != None:
+      cache.record(s.board, int(s.width), stats["pathToSolution"][len(s.path):], optimal, Heuristics.heuristicToStr(s.heuristicFunction), stats["numNodesExplored"])
+  
+  def _buildStats(startingBoard, start, numNodes, path, debug=False):
+    """
+    ----------------------------------------------------------
+    Description: Builds the stats dictionary returned by the solvers.
+    Use: return Puzzle._buildStats(s, start, len(explored), path, debug)
+    ----------------------------------------------------------
+    Parameters:
+      startingBoard - The state the search started from.
+      start - The time the search started at.
+      numNodes - The number of nodes the search expanded.
+      path - The tiles moved to solve the puzzle.
+      debug - Whether or not to print the stats.
+    Returns:
+      stats - See Puzzle.solvePuzzle.
+    ----------------------------------------------------------
+    """
     end = time.time()
     stats = {
-      'timeTaken': (time.time() - start),
-      'numNodesExplored': len(explored),
-      'pathToSolution': s.path[:],
-      'nodesPerSecond': len(explored) / ((end - start) if (end - start) != 0 else 0.01),
-      'startingBoard': '-'.join(str(x) for x in startingBoard.board)
+      'timeTaken': (end - start),
+      'numNodesExplored': numNodes,
+      'pathToSolution': path,
+      'nodesPerSecond': numNodes / ((end - start) if (end - start) != 0 else 0.01),
+      'startingBoard': '-'.join(str(x) for x in startingBoard.board),
+      'status': "optimal", # the anytime search overrides these three
+      'bound': len(path),
+      'suboptimality': 1.0
     }
     if debug: 
-      print('\ndone:\t', str(s)) 
+      print('\ndone:\t', ','.join(map(str, range(startingBoard.boardLength)))) 
       print("\t{:<30} ---> {:.2f}s ".format("Time taken to complete puzzle:",stats["timeTaken"]))
       print("\t{:<30} ---> {} ".format("Number of expanded nodes:",str(stats["numNodesExplored"])))
       print("\t{:<30} ---> {} ".format("Number of steps to solution:",str(len(stats["pathToSolution"]))))
       print("\t{:<30} ---> {} ".format("Path to Solution:",str(stats["pathToSolution"])))
       print("\t{:<30} ---> {:.2f} nodes/s ".format("Nodes expanded per second:",stats["nodesPerSecond"]))
     return stats
+  
+  def strToSolver(str):
+    if (str == "astar"):
+      return Puzzle.solvePuzzle
+    elif (str == "ida"):
+      return Puzzle.solvePuzzleIDA
+    elif (str == "bidir"):
+      return Puzzle.solvePuzzleBidirectional
+    elif (str == "hda"):
+      return Puzzle.solvePuzzleHDA
+    elif (str == "external"):
+      return Puzzle.solvePuzzleExternal
 
 class State:
   def __init__(self, board, width, g=0, h=None, path = [], heuristic=Heuristics.MANHATTAN):
@@ -376,30 +2290,74 @@ class State:
     index2 = int(index2)
     step = board[index2]
     board[index1], board[index2] = board[index2], board[index1]
-    newState = State(board, self.width, self.g + 1, path = self.path + [step], heuristic=self.heuristicFunction)
-    #f, newState.board, newState.g, newState.h, newState.path, newState.heuristicFunction
-    return newState._getStateAsStr()
+    return State(board, self.width, self.g + 1, path = self.path + [step], heuristic=self.heuristicFunction)
   
-  def _getStateAsStr(self):
-    return (self.f, self.h, '%s|%s|%s|%s|%s' % (State.arrayToStr(self.board), self.g, self.h, State.arrayToStr(self.path), Heuristics.heuristicToStr(self.heuristicFunction)))
+  def toKey(self):
+    """
+    ----------------------------------------------------------
+    Description: Packs the board into a single int, bitsPerTile bits per
+      tile with index 0 in the lowest bits. Used as the state key by the solver.
+    Use: key = state.toKey()
+    ----------------------------------------------------------
+    Returns:
+      key - The packed board.
+    ----------------------------------------------------------
+    """
+    bits = State.bitsPerTile(self.boardLength)
+    key = 0
+    for i in range(self.boardLength - 1, -1, -1):
+      key = (key << bits) | self.board[i]
+    return key
   
-  def arrayToStr(board):
-    return ','.join(map(str, board))
-    
-  def strToState(str):
-    boardAsStr, g, h, pathAsStr, heuristic = str.split('|') # split the string into the board, g, h, path, and heuristic
-    board = list(map(int, boardAsStr.split(','))) # convert the stringified board to a list of ints
-    path = list(pathAsStr.split(',')) if pathAsStr != '' else [] # convert the stringified path to a list of ints
-    # print('path =================', path)
-    # print("Board: ",board, "g: ",g, "h: ",h, "path: ",path, "heuristic: ",heuristic)
-    return State(board, math.sqrt(len(board)), float(g), float(h), path, Heuristics.strToHeuristic(heuristic))
+  def goalKey(boardLength):
+    bits = State.bitsPerTile(boardLength)
+    key = 0
+    for tile in range(boardLength - 1, -1, -1):
+      key = (key << bits) | tile
+    return key
+  
+  def bitsPerTile(boardLength):
+    return max(4, (boardLength - 1).bit_length()) # 4 bits up to the 15-puzzle, 5 for the 24-puzzle, 6 for the 35-puzzle
+  
+  def keyToBoard(key, boardLength, bits=None):
+    if bits == None:
+      bits = State.bitsPerTile(boardLength)
+    mask = (1 << bits) - 1
+    board = []
+    for i in range(boardLength):
+      board.append(key & mask)
+      key >>= bits
+    return board
+  
+  def neighbourTable(width):
+    """
+    ----------------------------------------------------------
+    Description: Precomputes the indices adjacent to every index of the board.
+    Use: neighbours = State.neighbourTable(4)
+    ----------------------------------------------------------
+    Returns:
+      neighbours - neighbours[i] is a tuple of the indices a tile can slide
+        into i from.
+    ----------------------------------------------------------
+    """
+    neighbours = []
+    for index in range(width * width):
+      row = index // width
+      col = index % width
+      adjacent = []
+      if row > 0:
+        adjacent.append(index - width)
+      if row < width - 1:
+        adjacent.append(index + width)
+      if col > 0:
+        adjacent.append(index - 1)
+      if col < width - 1:
+        adjacent.append(index + 1)
+      neighbours.append(tuple(adjacent))
+    return neighbours
   
   def isSolvable(self):
-    inversions = 0
-    for i in range(self.boardLength):
-      for j in range(i + 1, self.boardLength):
-        if self.board[i] != 0 and self.board[j] != 0 and self.board[i] > self.board[j]:
-          inversions += 1
+    inversions = State.inversionParity(self.board)
     
     if self.width % 2 == 0:
       row = self.board.index(0) // self.width
@@ -408,4 +2366,44 @@ class State:
       else:
         return inversions % 2 == 1
     else:
-      return inversions % 2 == 0
\ No newline at end of file
+      return inversions % 2 == 0
+  
+  def inversionParity(board):
+    """
+    ----------------------------------------------------------
+    Description: The parity of the number of inversions among the tiles of
+      the board, leaving out the blank, in O(n). The tiles read in order are
+      a permutation of 1 to n, and a permutation of m items made of c cycles
+      has m - c inversions modulo 2.
+    Use: parity = State.inversionParity([1, 2, 0, 3, 4, 5, 6, 7, 8])
+    ----------------------------------------------------------
+    Returns:
+      parity - 0 if the number of inversions is even, 1 if it is odd.
+    ----------------------------------------------------------
+    """
+    tiles = [tile - 1 for tile in board if tile != 0]
+    seen = [False] * len(tiles)
+    cycles = 0
+    for start in range(len(tiles)):
+      if not seen[start]:
+        cycles += 1
+        index = start
+        while not seen[index]:
+          seen[index] = True
+          index = tiles[index]
+    return (len(tiles) - cycles) % 2
+
+class InvalidPuzzle:
+  """
+  ----------------------------------------------------------
+  Description: A line of an input file that could not be solved, yielded by
+    Puzzle.readPuzzles in place of a State so it can be reported.
+  ----------------------------------------------------------
+  """
+  def __init__(self, lineNumber, text, reason):
+    self.lineNumber = lineNumber
+    self.text = text
+    self.reason = reason
+  
+  def __str__(self):
+    return "line {}: {} ({})".format(self.lineNumber, self.reason, self.text)
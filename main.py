@@ -1,6 +1,7 @@
-from lib import Heuristics, Puzzle, State
+from lib import Heuristics, Puzzle, PatternDatabase, SolutionCache, State
 from alive_progress import alive_bar
 import argparse, math
+from functools import partial
 import re
 
 def validPuzzle(string):
@@ -10,51 +11,111 @@ def validPuzzle(string):
   return string
 
 parser = argparse.ArgumentParser(description='A* algorithm for n-puzzle')
-parser.add_argument("-H", "--heuristic", help="The heuristic to use", choices=["manhattan", "displacement", "rowcol", "euclidean", "linear", "all"], default="manhattan")
+parser.add_argument("-H", "--heuristic", help="The heuristic to use", choices=["manhattan", "displacement", "rowcol", "euclidean", "linear", "patterndb", "all"], default="manhattan")
 parser.add_argument("-s", "--size", help="The size of the puzzle e.g. 8 for 8-puzzle (3x3)", choices=[8, 15, 24, 35], type=int, default=8)
 parser.add_argument("-n", "--numberOfPuzzles", help="The number of puzzles that will randomly generate.", type=int, default=100)
 parser.add_argument("-S", "--seed", help="The seed for the random number generator", type=int, default=None)
 parser.add_argument("-o", "--outputFile", help="Supplies the file name to output text to.", default="output.txt")
 parser.add_argument("-csv", "--outputCSV", help="Supplies the file name to output to csv data to.", default="stats.csv")
 parser.add_argument("-d", "--debug", help="Supplies the file name to output to csv data to.", action="store_true")
+parser.add_argument("-a", "--algorithm", help="The search to solve puzzles with, ida uses memory linear in the solution depth, bidir searches from both ends and hda splits each puzzle across the workers and external spills the search to disk to stay under --memoryLimit", choices=["astar", "ida", "bidir", "hda", "external"], default="astar")
+parser.add_argument("-q", "--queue", help="The A* open list, auto uses buckets for integer valued heuristics and a heap otherwise", choices=["auto", "bucket", "heap"], default="auto")
+parser.add_argument("-t", "--tiebreak", help="Which A* node to expand first when f is tied: lowest h, lowest g or most recently generated", choices=["h", "g", "none"], default="h")
+parser.add_argument("--pdb", help="The pattern database file for the patterndb heuristic, defaults to the one buildpdb.py writes for the size", default=None)
+parser.add_argument("-w", "--workers", help="The number of processes to solve puzzles in, with hda the number each puzzle is split across", type=int, default=1)
+parser.add_argument("--memoryLimit", help="The peak RSS in MiB for -a external to stay under, per worker", type=int, default=1024)
+parser.add_argument("--spillDir", help="Where -a external writes its temporary files, defaults to the system temporary directory", default=None)
+parser.add_argument("-i", "--input", help="Read puzzles from a CSV or JSONL file, or - for stdin, instead of generating them", default=None)
+parser.add_argument("--inputFormat", help="The format of --input, auto goes by the file extension or the first line of stdin", choices=["auto", "csv", "jsonl"], default="auto")
+parser.add_argument("-m", "--metrics", help="Record search metrics, writing a JSON Lines file of samples per puzzle to this directory in ./output and adding the summary to the CSV", default=None)
+parser.add_argument("--metricsInterval", help="The number of expansions between metrics samples", type=int, default=10000)
+parser.add_argument("--cache", help="The SQLite file solutions are stored in and served from on later runs", default=SolutionCache.DEFAULT_PATH)
+parser.add_argument("--cacheSize", help="The most solutions to keep in the cache, the least recently used are evicted", type=int, default=1000000)
+parser.add_argument("--noCache", help="Search every puzzle, without reading or writing the cache", action="store_true")
+parser.add_argument("--weight", help="Solve with anytime weighted A*, expanding by g + WEIGHT * h to find a solution sooner and then improving it", type=float, default=None)
+parser.add_argument("--maxNodes", "--max-nodes", help="Stop each search after exploring this many nodes with the best solution so far (anytime A*)", type=int, default=None)
+parser.add_argument("--timeLimit", "--time-limit", help="Stop each search after this many seconds with the best solution so far (anytime A*)", type=float, default=None)
 parser.add_argument("-p", "--puzzle", help="Supply a puzzle for the program to solve. e.g. '-p 1,5,2,4,3,7,6,8,0'", default=None, type=validPuzzle)
-args = parser.parse_args()
+def getPuzzles(args, heuristic):
+  if(args.input != None):
+    return Puzzle.readPuzzles(args.input, heuristic, args.inputFormat)
+  elif(args.puzzle == None):
+    return Puzzle.randomizePuzzles(heuristic, args.size, args.numberOfPuzzles, args.seed)
+  else:
+    return [State(heuristic=heuristic, width=math.sqrt(args.size+1), board=list(map(int,args.puzzle.split(","))))]
+
+def unusable(args, heuristic):
+  """
+  ----------------------------------------------------------
+  Description: Checks the search and queue asked for can use a heuristic.
+  Use: reason = unusable(args, Heuristics.EUCLIDEAN)
+  ----------------------------------------------------------
+  Returns:
+    reason - Why the heuristic cannot be used, None if it can.
+  ----------------------------------------------------------
+  """
+  if(args.algorithm == "external" and not (Heuristics.isIntegral(heuristic) and Heuristics.isConsistent(heuristic))):
+    return "-a external needs an integer valued consistent heuristic, not " + Heuristics.heuristicToStr(heuristic)
+  if(args.algorithm == "astar" and args.queue == "bucket" and args.weight == None and args.maxNodes == None and args.timeLimit == None and not Heuristics.isIntegral(heuristic)):
+    return "-q bucket needs an integer valued heuristic, not " + Heuristics.heuristicToStr(heuristic)
+  return None
+
+def main():
+  args = parser.parse_args()
+  solver = Puzzle.strToSolver(args.algorithm)
+  workers = args.workers
+  if(args.weight != None or args.maxNodes != None or args.timeLimit != None):
+    if(args.algorithm != "astar"):
+      parser.error("--weight, --maxNodes and --timeLimit are only supported by astar")
+    solver = partial(Puzzle.solvePuzzleAnytime, weight=args.weight if args.weight != None else 1, maxNodes=args.maxNodes, timeLimit=args.timeLimit)
+  elif(args.algorithm == "astar"):
+    solver = partial(solver, queue=args.queue, tiebreak=args.tiebreak)
+  elif(args.algorithm == "hda"): # the workers search one puzzle at a time
+    solver = partial(solver, workers=args.workers)
+    workers = 1
+  elif(args.algorithm == "external"):
+    solver = partial(solver, memoryLimit=args.memoryLimit, directory=args.spillDir)
+  if(not args.noCache and args.heuristic != "all"): # -H all compares the heuristics, which needs every puzzle searched
+    solver = partial(solver, cache=SolutionCache(args.cache, args.cacheSize))
+  if(args.pdb != None):
+    PatternDatabase.use(args.pdb)
 
-if(args.heuristic == "manhattan"):
-  heuristic = Heuristics.MANHATTAN
-elif(args.heuristic == "displacement"):
-  heuristic = Heuristics.DISPLACEMENT
-elif(args.heuristic == "rowcol"):
-  heuristic = Heuristics.ROWCOL
-elif(args.heuristic == "euclidean"):
-  heuristic = Heuristics.EUCLIDEAN
-elif(args.heuristic == "linear"):
-  #TODO remove if linear conflict is implemented properly
-  print("\033[93m\nDISCLAIMER: Linear conflict is not implemented properly yet, it sometimes overestimates cost making it non-admisable.\033[0m")
-  heuristic = Heuristics.LINEARCONFLICT
-elif(args.heuristic == "all"):
-  heuristics = [Heuristics.DISPLACEMENT, Heuristics.MANHATTAN, Heuristics.ROWCOL, Heuristics.EUCLIDEAN, Heuristics.LINEARCONFLICT]
-  for heuristic in heuristics:
-    if(args.puzzle == None):
-      puzzles = Puzzle.randomizePuzzles(heuristic, args.size, args.numberOfPuzzles, args.seed)
-    else:
-      puzzles = [State(heuristic, args.size, args.puzzle.split(","))]
-    heuristicString = Heuristics.heuristicToStr(heuristic)
-    if(heuristicString == "LINEARCONFLICT"):
-      #TODO remove if linear conflict is implemented properly
-      print("\033[93m\nDISCLAIMER: Linear conflict is not implemented properly yet, it sometimes overestimates cost making it non-admisable.\033[0m")
-    print("\nHeuristic: " + heuristicString)
-    outFile = heuristicString + "_" + args.outputFile
-    outCSV = heuristicString + "_" + args.outputCSV
-    with alive_bar(len(puzzles), enrich_print=False) as bar:
-      for i in Puzzle.solvePuzzleArray(puzzles, outFile, outCSV, args.debug):
+  if(args.heuristic == "manhattan"):
+    heuristic = Heuristics.MANHATTAN
+  elif(args.heuristic == "displacement"):
+    heuristic = Heuristics.DISPLACEMENT
+  elif(args.heuristic == "rowcol"):
+    heuristic = Heuristics.ROWCOL
+  elif(args.heuristic == "euclidean"):
+    heuristic = Heuristics.EUCLIDEAN
+  elif(args.heuristic == "patterndb"):
+    heuristic = Heuristics.PATTERNDB
+  elif(args.heuristic == "linear"):
+    heuristic = Heuristics.LINEARCONFLICT
+  if(args.heuristic != "all" and unusable(args, heuristic) != None):
+    parser.error(unusable(args, heuristic))
+  if(args.heuristic == "all"):
+    heuristics = [Heuristics.DISPLACEMENT, Heuristics.MANHATTAN, Heuristics.ROWCOL, Heuristics.EUCLIDEAN, Heuristics.LINEARCONFLICT]
+    if(args.input == "-"):
+      parser.error("stdin can only be read once, save it to a file to solve it with every heuristic")
+    for heuristic in heuristics:
+      if(unusable(args, heuristic) != None):
+        print("\nSkipping " + Heuristics.heuristicToStr(heuristic) + ", " + unusable(args, heuristic))
+        continue
+      puzzles = getPuzzles(args, heuristic)
+      heuristicString = Heuristics.heuristicToStr(heuristic)
+      print("\nHeuristic: " + heuristicString)
+      outFile = heuristicString + "_" + args.outputFile
+      outCSV = heuristicString + "_" + args.outputCSV
+      with alive_bar(len(puzzles) if isinstance(puzzles, list) else None, enrich_print=False) as bar:
+        for i in Puzzle.solvePuzzleArray(puzzles, outFile, outCSV, args.debug, solver, workers, args.metrics, args.metricsInterval):
+          bar()
+  if(args.heuristic != "all"):
+    puzzles = getPuzzles(args, heuristic)
+    print("\nHeuristic: " + Heuristics.heuristicToStr(heuristic))
+    with alive_bar(len(puzzles) if isinstance(puzzles, list) else None, enrich_print=False) as bar:
+      for i in Puzzle.solvePuzzleArray(puzzles, args.outputFile, args.outputCSV, args.debug, solver, workers, args.metrics, args.metricsInterval):
         bar()
-if(args.heuristic != "all"):
-  if(args.puzzle == None):
-    puzzles = Puzzle.randomizePuzzles(heuristic, args.size, args.numberOfPuzzles, args.seed)
-  else:
-    puzzles = [State(heuristic=heuristic, width=math.sqrt(args.size+1), board=list(map(int,args.puzzle.split(","))))]
-  print("\nHeuristic: " + Heuristics.heuristicToStr(heuristic))
-  with alive_bar(len(puzzles), enrich_print=False) as bar:
-    for i in Puzzle.solvePuzzleArray(puzzles, args.outputFile, args.outputCSV, args.debug):
-      bar()
\ No newline at end of file
+
+if __name__ == "__main__": # worker processes import this module, so only run when executed
+  main()
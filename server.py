@@ -0,0 +1,317 @@
+from lib import Heuristics, Puzzle, PatternDatabase, SolutionCache, State
+import argparse, asyncio, json, math, os, signal, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+HEURISTICS = {"manhattan": Heuristics.MANHATTAN, "displacement": Heuristics.DISPLACEMENT, "rowcol": Heuristics.ROWCOL, "euclidean": Heuristics.EUCLIDEAN, "linear": Heuristics.LINEARCONFLICT, "patterndb": Heuristics.PATTERNDB}
+LATENCY_WINDOW = 10000 # solves the latency percentiles are taken over
+MAX_BODY = 64 * 1024 * 1024 # bytes
+
+workerCache = None # each worker process's connection to the solution cache
+
+def initWorker(pdbPaths, cachePath, cacheSize, warmSizes):
+  """
+  ----------------------------------------------------------
+  Description: Readies a worker process, mapping the same pattern databases
+    as the server, opening the solution cache and building the heuristic
+    tables for the given sizes so the first requests do not pay for them.
+  Use: ProcessPoolExecutor(2, initializer=initWorker, initargs=([], None, 0, [8, 15]))
+  ----------------------------------------------------------
+  Parameters:
+    pdbPaths - The pattern database files the server has open.
+    cachePath - The solution cache file, None to solve without it.
+    cacheSize - The most solutions to keep in the cache.
+    warmSizes - The puzzle sizes to build the tables of, e.g. [8, 15].
+  ----------------------------------------------------------
+  """
+  global workerCache
+  signal.signal(signal.SIGINT, signal.SIG_IGN) # the server shuts the pool down
+  PatternDatabase._useAll(pdbPaths)
+  if cachePath != None:
+    workerCache = SolutionCache(cachePath, cacheSize)
+  for size in warmSizes:
+    width = math.isqrt(size + 1)
+    for heuristic in HEURISTICS.values():
+      try:
+        Heuristics.getDelta(heuristic, width)
+      except (ValueError, OSError): # no pattern database for this size
+        pass
+
+def solveBoard(board, heuristicName, weight, maxNodes, timeLimit):
+  """
+  ----------------------------------------------------------
+  Description: Solves one board in a worker process with anytime weighted
+    A*, which is plain A* for weight 1, stopping with the best solution so
+    far once the limits run out.
+  Use: result = solveBoard([1, 2, 0, 3, 4, 5, 6, 7, 8], "manhattan", 1, None, 10)
+  ----------------------------------------------------------
+  Returns:
+    result - The fields of the stats sent back to the client.
+  ----------------------------------------------------------
+  """
+  puzzle = State(board, math.isqrt(len(board)), heuristic=HEURISTICS[heuristicName])
+  stats = Puzzle.solvePuzzleAnytime(puzzle, weight=weight, maxNodes=maxNodes, timeLimit=timeLimit, cache=workerCache)
+  return {
+    "status": stats["status"],
+    "steps": len(stats["pathToSolution"]),
+    "path": stats["pathToSolution"],
+    "nodes": stats["numNodesExplored"],
+    "time": stats["timeTaken"],
+    "bound": stats["bound"],
+    "suboptimality": stats["suboptimality"],
+    "cached": stats.get("cached", False)
+  }
+
+class SolveServer:
+  """
+  ----------------------------------------------------------
+  Description: Solves boards sent over HTTP on a pool of long lived worker
+    processes, which keep their heuristic tables, pattern databases and
+    solution cache between requests. At most one board per worker is being
+    solved at a time, the rest wait in the queue, and boards identical to one
+    already queued or being solved share its result.
+  Use: server = SolveServer(workers=4, timeLimit=10)
+       await server.serve("127.0.0.1", 8765)
+  ----------------------------------------------------------
+  """
+  def __init__(self, workers=1, timeLimit=30, maxQueue=10000, cachePath=None, cacheSize=1000000, warmSizes=()):
+    self.workers = workers
+    self.timeLimit = timeLimit
+    self.maxQueue = maxQueue
+    self.pool = ProcessPoolExecutor(workers, initializer=initWorker, initargs=(PatternDatabase._openPaths(), cachePath, cacheSize, list(warmSizes)))
+    self.slots = None # made on the event loop
+    self.inFlight = {} # (board, options) -> the task solving it
+    self.queued = 0
+    self.running = 0
+    self.solved = 0
+    self.shared = 0
+    self.errors = 0
+    self.latencies = deque(maxlen=LATENCY_WINDOW)
+    self.started = time.time()
+
+  async def serve(self, host=None, port=None, socketPath=None):
+    """
+    ----------------------------------------------------------
+    Description: Serves requests until cancelled, on a TCP port or a Unix
+      socket.
+    Use: await server.serve(socketPath="/tmp/npuzzle.sock")
+    ----------------------------------------------------------
+    """
+    self.slots = asyncio.Semaphore(self.workers)
+    for i in range(self.workers): # start the workers now so their tables are ready for the first request
+      self.pool.submit(math.isqrt, 0)
+    if socketPath != None:
+      server = await asyncio.start_unix_server(self.handle, socketPath)
+    else:
+      server = await asyncio.start_server(self.handle, host, port)
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      self.pool.shutdown(wait=False, cancel_futures=True)
+      if socketPath != None and os.path.exists(socketPath):
+        os.remove(socketPath)
+
+  def stats(self):
+    """
+    ----------------------------------------------------------
+    Description: The queue depth, counters and the latency percentiles in
+      seconds of the last LATENCY_WINDOW solves, from a board arriving to its
+      result being ready.
+    Use: print(server.stats())
+    ----------------------------------------------------------
+    """
+    latencies = sorted(self.latencies)
+    def percentile(p):
+      return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] if len(latencies) != 0 else None
+    return {
+      "queueDepth": self.queued,
+      "running": self.running,
+      "workers": self.workers,
+      "solved": self.solved,
+      "shared": self.shared,
+      "errors": self.errors,
+      "latency": {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99), "max": latencies[-1] if len(latencies) != 0 else None},
+      "uptime": time.time() - self.started
+    }
+
+  async def solve(self, board, heuristicName, weight, maxNodes, timeLimit):
+    key = (tuple(board), heuristicName, weight, maxNodes, timeLimit)
+    job = self.inFlight.get(key)
+    if job != None:
+      self.shared += 1
+    else:
+      if self.queued >= self.maxQueue:
+        raise OverflowError("queue is full")
+      self.queued += 1
+      job = asyncio.create_task(self.run(key))
+      job.add_done_callback(lambda job: job.cancelled() or job.exception()) # retrieved, even if every requester went away
+      self.inFlight[key] = job
+    return await asyncio.shield(job) # a requester going away leaves the solve to finish for the others
+
+  async def run(self, key):
+    board, heuristicName, weight, maxNodes, timeLimit = key
+    try:
+      async with self.slots:
+        self.queued -= 1
+        self.running += 1
+        try:
+          return await asyncio.get_running_loop().run_in_executor(self.pool, solveBoard, list(board), heuristicName, weight, maxNodes, timeLimit)
+        finally:
+          self.running -= 1
+    finally:
+      del self.inFlight[key]
+
+  async def solveEntry(self, index, entry):
+    """
+    ----------------------------------------------------------
+    Description: Solves one entry of a request, a board (a list of tiles or
+      a board string) or an object with a "puzzle" or "board" key and
+      optional "heuristic", "weight", "maxNodes" and "timeLimit" keys.
+    Use: line = await server.solveEntry(0, {"puzzle": "1,2,0,3,4,5,6,7,8"})
+    ----------------------------------------------------------
+    Returns:
+      line - The result sent back, with the entry's index in the request.
+    ----------------------------------------------------------
+    """
+    arrived = time.time()
+    try:
+      options = entry if isinstance(entry, dict) else {"puzzle": entry}
+      board = Puzzle.parseBoard(options["puzzle"] if "puzzle" in options else options["board"])
+      heuristicName = options.get("heuristic", "manhattan")
+      if heuristicName not in HEURISTICS:
+        raise ValueError("heuristic must be one of " + ", ".join(HEURISTICS))
+      weight = float(options.get("weight", 1))
+      maxNodes = int(options["maxNodes"]) if options.get("maxNodes") != None else None
+      timeLimit = min(float(options.get("timeLimit", self.timeLimit)), self.timeLimit)
+      if weight < 1 or timeLimit <= 0 or (maxNodes != None and maxNodes <= 0):
+        raise ValueError("weight must be at least 1 and the limits positive")
+      if not State(board, math.isqrt(len(board)), h=0).isSolvable():
+        raise ValueError("unsolvable")
+    except (ValueError, TypeError, KeyError) as error:
+      self.errors += 1
+      return {"index": index, "error": "malformed: no puzzle or board key" if isinstance(error, KeyError) else str(error)}
+    try:
+      result = await self.solve(board, heuristicName, weight, maxNodes, timeLimit)
+    except Exception as error:
+      self.errors += 1
+      return {"index": index, "puzzle": "-".join(map(str, board)), "error": str(error)}
+    latency = time.time() - arrived
+    self.latencies.append(latency)
+    self.solved += 1
+    return dict({"index": index, "puzzle": "-".join(map(str, board)), "latency": latency}, **result)
+
+  async def handle(self, reader, writer):
+    """
+    ----------------------------------------------------------
+    Description: Serves the HTTP/1.1 requests of one connection, which is
+      kept alive between requests unless the client closes it.
+        POST /solve - The body is JSON Lines of entries (see solveEntry), or
+          one entry. A JSON line of each result is streamed back as soon as
+          it is ready, so they can come back out of order.
+        GET /stats  - The queue depth and latency percentiles (see stats).
+    Use: await asyncio.start_server(server.handle, "127.0.0.1", 8765)
+    ----------------------------------------------------------
+    """
+    try:
+      while True:
+        requestLine = await reader.readline()
+        if requestLine == b"":
+          return
+        parts = requestLine.decode("latin-1").split()
+        headers = {}
+        while True:
+          line = await reader.readline()
+          if line in (b"\r\n", b"\n", b""):
+            break
+          name, _, value = line.decode("latin-1").partition(":")
+          headers[name.strip().lower()] = value.strip()
+        if len(parts) != 3:
+          await self.respond(writer, 400, {"error": "bad request line"}, close=True)
+          return
+        method, target, version = parts
+        keepAlive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        if "transfer-encoding" in headers:
+          await self.respond(writer, 411, {"error": "send the body with a Content-Length"}, close=True)
+          return
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY:
+          await self.respond(writer, 413, {"error": "body over {} bytes".format(MAX_BODY)}, close=True)
+          return
+        body = await reader.readexactly(length) if length > 0 else b""
+        path = urlsplit(target).path
+        if path == "/stats" and method == "GET":
+          await self.respond(writer, 200, self.stats(), close=not keepAlive)
+        elif path == "/solve" and method == "POST":
+          await self.stream(writer, body, close=not keepAlive)
+        elif path in ("/stats", "/solve"):
+          await self.respond(writer, 405, {"error": "method not allowed"}, close=not keepAlive)
+        else:
+          await self.respond(writer, 404, {"error": "not found"}, close=not keepAlive)
+        if not keepAlive:
+          return
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+      pass
+    finally:
+      writer.close()
+
+  async def respond(self, writer, status, result, close=False):
+    data = (json.dumps(result) + "\n").encode()
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n{}\r\n".format(status, STATUS_TEXT[status], len(data), "Connection: close\r\n" if close else "").encode() + data)
+    await writer.drain()
+
+  async def stream(self, writer, body, close=False):
+    try:
+      text = body.decode()
+      entries = [json.loads(line) for line in text.splitlines() if line.strip() != ""]
+      if len(entries) == 1 and isinstance(entries[0], dict) and "puzzles" in entries[0]: # a batch as one object
+        entries = entries[0]["puzzles"]
+    except (UnicodeDecodeError, json.JSONDecodeError) as error:
+      await self.respond(writer, 400, {"error": "body is not JSON Lines: " + str(error)}, close=close)
+      return
+    if not isinstance(entries, list): # checked before the headers go out, a failure after them would cut the response short
+      await self.respond(writer, 400, {"error": "puzzles must be a list of entries"}, close=close)
+      return
+    writer.write("HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n{}\r\n".format("Connection: close\r\n" if close else "").encode())
+    await writer.drain()
+    tasks = [asyncio.create_task(self.solveEntry(index, entry)) for index, entry in enumerate(entries)]
+    try:
+      for task in asyncio.as_completed(tasks):
+        data = (json.dumps(await task) + "\n").encode()
+        writer.write("{:x}\r\n".format(len(data)).encode() + data + b"\r\n")
+        await writer.drain()
+      writer.write(b"0\r\n\r\n")
+      await writer.drain()
+    finally:
+      for task in tasks: # the client went away, stop waiting for its boards
+        task.cancel()
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required", 413: "Content Too Large"}
+
+def main():
+  parser = argparse.ArgumentParser(description='Serves n-puzzle solves over HTTP from warm worker processes')
+  parser.add_argument("--host", help="The address to listen on", default="127.0.0.1")
+  parser.add_argument("--port", help="The port to listen on", type=int, default=8765)
+  parser.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port", default=None)
+  parser.add_argument("-w", "--workers", help="The number of worker processes solving boards", type=int, default=os.cpu_count() or 1)
+  parser.add_argument("--timeLimit", "--time-limit", help="The most seconds to spend on a board, requests can ask for less", type=float, default=30)
+  parser.add_argument("--maxQueue", help="The most boards waiting for a worker before new ones are turned away", type=int, default=10000)
+  parser.add_argument("--warm", help="The puzzle sizes to build the heuristic tables of at startup", nargs="*", type=int, default=[8, 15])
+  parser.add_argument("--pdb", help="The pattern database file for the patterndb heuristic, defaults to the one buildpdb.py writes for the size", default=None)
+  parser.add_argument("--cache", help="The SQLite file solutions are stored in and served from", default=SolutionCache.DEFAULT_PATH)
+  parser.add_argument("--cacheSize", help="The most solutions to keep in the cache, the least recently used are evicted", type=int, default=1000000)
+  parser.add_argument("--noCache", help="Search every board, without reading or writing the cache", action="store_true")
+  args = parser.parse_args()
+
+  if args.pdb != None:
+    PatternDatabase.use(args.pdb)
+  server = SolveServer(args.workers, args.timeLimit, args.maxQueue, None if args.noCache else args.cache, args.cacheSize, args.warm)
+  print("Serving on " + (args.socket if args.socket != None else "http://{}:{}".format(args.host, args.port)) + " with {} workers".format(args.workers), flush=True)
+  try:
+    asyncio.run(server.serve(args.host, args.port, args.socket))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__": # worker processes import this module, so only run when executed
+  main()